@@ -4,6 +4,7 @@ from pathlib import Path
 
 import streamlit as st
 
+from src.features.pending_worker import start_pending_worker
 from src.services.qdrant_service import ensure_collection_exists, get_qdrant_client
 from src.ui.tab_add import render_add
 from src.ui.tab_gallery import render_gallery
@@ -15,7 +16,15 @@ IMAGES_DIR = Path("data/images")
 
 @st.cache_resource
 def get_qdrant_cached():
-    return get_qdrant_client()
+    # Schema/index reconciliation runs once per process, not on every rerun.
+    client = get_qdrant_client()
+    ensure_collection_exists(client)
+    return client
+
+
+@st.cache_resource
+def get_pending_worker_cached():
+    return start_pending_worker(get_qdrant_cached())
 
 
 def main() -> None:
@@ -23,7 +32,7 @@ def main() -> None:
     st.title("🖼️ Image Finder")
 
     qdrant = get_qdrant_cached()
-    ensure_collection_exists(qdrant)
+    get_pending_worker_cached()
 
     options = ["Gallery", "Add photo", "Search", "History"]
     default_tab = st.session_state.get("menu", "Gallery")
@@ -38,7 +47,7 @@ def main() -> None:
     elif tab == "Search":
         render_search(qdrant)
     else:
-        render_history()
+        render_history(qdrant)
 
 
 if __name__ == "__main__":
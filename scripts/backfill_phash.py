@@ -0,0 +1,54 @@
+"""Backfill the `phash` payload field for points indexed before near-duplicate detection.
+
+Reads each point's image from its `filename`, computes the 64-bit dHash and writes it back
+with batched set-payload requests. No OpenAI calls are made.
+
+Usage:
+    python scripts/backfill_phash.py           # only points without phash
+    python scripts/backfill_phash.py --force   # recompute for every point
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from src.features.preprocess import decode_downscaled
+from src.services.qdrant_service import ensure_collection_exists, get_qdrant_client, iter_points, set_payloads
+from src.utils.phash import dhash, to_hex
+
+
+def main(force: bool = False) -> None:
+    qdrant = get_qdrant_client()
+    ensure_collection_exists(qdrant)
+
+    counts = {"scanned": 0, "already": 0, "missing_file": 0, "unreadable": 0}
+
+    def updates() -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        for rec in iter_points(qdrant, with_payload=["filename", "phash"]):
+            counts["scanned"] += 1
+            payload = rec.payload or {}
+            if payload.get("phash") and not force:
+                counts["already"] += 1
+                continue
+            path = Path(str(payload.get("filename") or ""))
+            if not path.is_file():
+                counts["missing_file"] += 1
+                continue
+            try:
+                h = dhash(decode_downscaled(path.read_bytes()))
+            except Exception:
+                counts["unreadable"] += 1
+                continue
+            yield rec.id, {"phash": to_hex(h)}
+
+    updated = set_payloads(qdrant, updates())
+    print(f"Backfilled phash for {updated} points | " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Backfill perceptual hashes for indexed points.")
+    ap.add_argument("--force", action="store_true", help="recompute even if phash is already set")
+    args = ap.parse_args()
+    main(force=args.force)
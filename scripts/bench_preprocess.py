@@ -0,0 +1,68 @@
+"""Micro-benchmark: legacy PNG re-encode vs the fast preprocessing path.
+
+Legacy:  full decode -> RGB -> resize -> PNG(optimize=True) -> sha1 of the PNG
+Fast:    read bytes -> sha1 of the file -> JPEG draft decode -> thumbnail -> JPEG/WebP
+
+Reports images/s and the average base64 payload sent to the VLM for each path.
+
+Usage:
+    python scripts/bench_preprocess.py [--dir data/images] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from PIL import Image
+
+from src.config import settings
+from src.features.preprocess import prepare_file
+from src.features.vision import pil_to_png_bytes
+from src.utils.ids import stable_id_from_bytes
+
+
+def _legacy(path: Path) -> int:
+    img = Image.open(path).convert("RGB")
+    data = pil_to_png_bytes(img)
+    stable_id_from_bytes(data)
+    return len(data)
+
+
+def _fast(path: Path) -> int:
+    return len(prepare_file(path).data)
+
+
+def _bench(fn: Callable[[Path], int], files: List[Path], repeat: int) -> Tuple[float, float]:
+    sizes: List[int] = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for p in files:
+            sizes.append(fn(p))
+    elapsed = time.perf_counter() - t0
+    b64_kb = (sum(sizes) / len(sizes)) * 4 / 3 / 1024
+    return len(sizes) / elapsed, b64_kb
+
+
+def main(images_dir: str = "data/images", repeat: int = 3) -> None:
+    files = sorted(p for p in Path(images_dir).glob("*") if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".webp"})
+    if not files:
+        print(f"No images in {images_dir}.")
+        return
+
+    print(f"{len(files)} images x {repeat} | VLM format={settings.vlm_image_format} q={settings.vlm_image_quality} max_side={settings.vlm_max_side}")
+    rows = [("legacy PNG", _bench(_legacy, files, repeat)), ("fast path", _bench(_fast, files, repeat))]
+    for name, (ips, kb) in rows:
+        print(f"{name:<12} {ips:8.1f} img/s   avg payload {kb:8.1f} KB (base64)")
+    (l_ips, l_kb), (f_ips, f_kb) = rows[0][1], rows[1][1]
+    print(f"speed-up x{f_ips / l_ips:.1f}, payload x{l_kb / f_kb:.1f} smaller")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark image preprocessing paths.")
+    ap.add_argument("--dir", default="data/images")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    main(args.dir, args.repeat)
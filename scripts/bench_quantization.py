@@ -0,0 +1,131 @@
+"""Quantization benchmark: memory footprint, latency and recall@k vs the float32 baseline.
+
+Copies the vectors of the app collection into temporary collections (one per mode),
+uses a sample of stored vectors as queries, computes exact top-k on the baseline as
+ground truth, and reports for each mode:
+- estimated RAM for vectors (quantized copy in RAM, originals on disk when VECTORS_ON_DISK=1)
+- p50/p95 query latency
+- recall@k against exact search
+
+No OpenAI calls are made. Needs a Qdrant server: local mode ignores quantization.
+
+Usage:
+    python scripts/bench_quantization.py [--modes none,scalar,binary] [--queries 100] [--k 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from itertools import islice
+from typing import Any, Dict, List
+
+from src.config import settings
+from src.services.qdrant_service import (
+    dense_vector,
+    ensure_collection_exists,
+    get_qdrant_client,
+    is_local,
+    iter_points,
+    search,
+    upsert_points,
+)
+from src.utils.stats import summarize
+
+BENCH_PREFIX = "bench_quant_"
+
+
+def _ram_bytes(n: int, dim: int, mode: str) -> int:
+    originals = 0 if settings.vectors_on_disk else n * dim * 4
+    if mode == "scalar":
+        return originals + n * dim
+    if mode == "binary":
+        return originals + n * dim // 8
+    return n * dim * 4
+
+
+def _wait_indexed(client, name: str, timeout: float = 300.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(name)
+        if str(getattr(info.status, "value", info.status)) == "green":
+            return
+        time.sleep(0.5)
+
+
+def main(modes: List[str], n_queries: int = 100, k: int = 10, limit: int = 100_000, keep: bool = False) -> None:
+    qdrant = get_qdrant_client()
+    ensure_collection_exists(qdrant)
+    if is_local(qdrant):
+        print("Warning: local Qdrant ignores quantization; numbers will only reflect the baseline.")
+
+    records = iter_points(qdrant, with_payload=False, with_vectors=True)
+    points = [(p.id, dense_vector(p.vector), {}) for p in islice(records, limit) if dense_vector(p.vector)]
+    if len(points) < k + 1:
+        print("Not enough points in Qdrant. Seed images first.")
+        return
+    dim = len(points[0][1])
+    random.seed(42)
+    queries = [vec for _, vec, _ in random.sample(points, min(n_queries, len(points)))]
+    print(f"{len(points)} points x {dim} dims | {len(queries)} queries | k={k}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    truth: List[List[str]] = []
+    try:
+        for mode in ["none"] + [m for m in modes if m != "none"]:
+            name = BENCH_PREFIX + mode
+            if qdrant.collection_exists(name):
+                qdrant.delete_collection(name)
+            ensure_collection_exists(qdrant, collection_name=name, vector_size=dim, quantization=mode)
+            upsert_points(qdrant, points, collection_name=name)
+            _wait_indexed(qdrant, name)
+
+            if mode == "none":
+                truth = [
+                    [str(r.id) for r in search(qdrant, q, k, exact=True, with_payload=False, collection_name=name)]
+                    for q in queries
+                ]
+
+            lat: List[float] = []
+            recall: List[float] = []
+            for q, gt in zip(queries, truth):
+                t0 = time.perf_counter()
+                res = search(qdrant, q, k, with_payload=False, collection_name=name)
+                lat.append((time.perf_counter() - t0) * 1000)
+                got = {str(r.id) for r in res}
+                recall.append(len(got & set(gt)) / max(1, len(gt)))
+
+            lat_s = summarize(lat)
+            results[mode] = {
+                "ram_mb": _ram_bytes(len(points), dim, mode) / 1024 / 1024,
+                "p50_ms": lat_s["p50"],
+                "p95_ms": lat_s["p95"],
+                "recall": sum(recall) / len(recall),
+            }
+    finally:
+        if not keep:
+            for mode in results:
+                try:
+                    qdrant.delete_collection(BENCH_PREFIX + mode)
+                except Exception:
+                    pass
+
+    print(f"{'mode':<8} {'RAM MB':>9} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{k}':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['ram_mb']:9.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['recall']:10.3f}")
+    print(
+        f"(oversampling={settings.search_oversampling}, rescore={settings.search_rescore}, "
+        f"always_ram={settings.quantization_always_ram}, vectors_on_disk={settings.vectors_on_disk})"
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark vector quantization modes.")
+    ap.add_argument("--modes", default="none,scalar,binary")
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--limit", type=int, default=100_000, help="max points copied from the app collection")
+    ap.add_argument("--keep", action="store_true", help="keep the temporary bench collections")
+    args = ap.parse_args()
+    main([m.strip() for m in args.modes.split(",") if m.strip()], args.queries, args.k, args.limit, args.keep)
@@ -0,0 +1,327 @@
+"""Retrieval benchmark: quality (recall@k, MRR, nDCG) and per-stage latency, over parameter sweeps.
+
+The query set is a fixed JSONL file, one query per line:
+    {"id": "q1", "query": "red car at night", "relevant": ["123", "456"]}
+`--build N` creates it from N random captioned points (caption as query, the point itself as
+the only relevant item), so every later run measures the same queries. Hand-labelled sets
+in the same format work too (and are valid scripts/bulk_query.py input).
+
+Query vectors go through the persistent embedding cache (data/cache): only the first run
+calls the embeddings API, and every sweep configuration reuses the same vectors.
+
+Stages timed per query (p50/p95/p99 in ms):
+- embed:   query text -> vector
+- search:  Qdrant query without payload
+- payload: fetch filename/caption of the hits
+
+Sweeps: `--ef` (HNSW ef), `--quantization` (temporary copies of the collection, like
+bench_quantization.py) and `--k`. Results are written as JSON; `--baseline` compares against
+an earlier run and exits with status 1 when quality drops or p95 latency grows beyond tolerance.
+Local (embedded) Qdrant is always exact: ef and quantization sweeps only make sense on a server.
+
+Usage:
+    python scripts/bench_retrieval.py --build 200
+    python scripts/bench_retrieval.py [--ef 32,64,128] [--quantization none,scalar] [--k 1,5,10] [--baseline OLD.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.features.embedding import embed_text, embedding_cache_stats
+from src.services.qdrant_service import (
+    collection_vector_size,
+    dense_vector,
+    ensure_collection_exists,
+    get_qdrant_client,
+    is_local,
+    iter_points,
+    resolve_alias,
+    search,
+    upsert_points,
+)
+from src.utils.stats import summarize
+
+BENCH_DIR = Path("data/bench")
+QUERIES_PATH = BENCH_DIR / "queries.jsonl"
+BENCH_PREFIX = "bench_retrieval_"
+
+# Regression tolerances: absolute drop for quality metrics, relative growth for p95 latency
+# (ignored below LATENCY_FLOOR_MS, where run-to-run noise dominates).
+QUALITY_TOL = 0.01
+LATENCY_TOL = 0.25
+LATENCY_FLOOR_MS = 1.0
+
+
+def build_queries(client, n: int, seed: int = 42, path: Path = QUERIES_PATH) -> int:
+    items = [
+        p
+        for p in iter_points(client, with_payload=["caption"])
+        if str((p.payload or {}).get("caption") or "").strip()
+    ]
+    random.seed(seed)
+    picks = random.sample(items, k=min(n, len(items)))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fh:
+        for p in picks:
+            rec = {"id": str(p.id), "query": p.payload["caption"], "relevant": [str(p.id)]}
+            fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return len(picks)
+
+
+def load_queries(path: Path = QUERIES_PATH) -> List[Dict[str, Any]]:
+    queries = []
+    for n, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        if rec.get("query") and rec.get("relevant"):
+            rec.setdefault("id", n)
+            rec["relevant"] = [str(r) for r in rec["relevant"]]
+            queries.append(rec)
+    return queries
+
+
+def quality(got: List[str], relevant: List[str], k: int) -> Dict[str, float]:
+    """recall@k, reciprocal rank and nDCG@k with binary relevance."""
+    rel = set(relevant)
+    top = got[:k]
+    ranks = [i for i, pid in enumerate(top) if pid in rel]
+    dcg = sum(1.0 / math.log2(i + 2) for i in ranks)
+    idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(rel), k)))
+    return {
+        "recall": len(ranks) / len(rel) if rel else 0.0,
+        "mrr": 1.0 / (ranks[0] + 1) if ranks else 0.0,
+        "ndcg": dcg / idcg if idcg else 0.0,
+    }
+
+
+def _copy_quantized(client, source: str, mode: str, dim: int) -> str:
+    name = BENCH_PREFIX + mode
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    ensure_collection_exists(client, collection_name=name, vector_size=dim, quantization=mode)
+    batch: List[Tuple[Any, List[float], Dict[str, Any]]] = []
+    for p in iter_points(client, with_payload=True, with_vectors=True, collection_name=source):
+        vec = dense_vector(p.vector)
+        if vec:
+            batch.append((p.id, vec, p.payload or {}))
+    upsert_points(client, batch, collection_name=name)
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        info = client.get_collection(name)
+        if str(getattr(info.status, "value", info.status)) == "green":
+            break
+        time.sleep(0.5)
+    return name
+
+
+def run_config(
+    client,
+    collection: str,
+    queries: List[Dict[str, Any]],
+    vectors: List[List[float]],
+    k: int,
+    ef: Optional[int],
+    hybrid: bool,
+) -> Dict[str, Any]:
+    search_ms: List[float] = []
+    payload_ms: List[float] = []
+    scores: Dict[str, List[float]] = {"recall": [], "mrr": [], "ndcg": []}
+    for rec, vec in zip(queries, vectors):
+        t0 = time.perf_counter()
+        res = search(
+            client,
+            vec,
+            k,
+            hnsw_ef=ef,
+            with_payload=False,
+            collection_name=collection,
+            text=rec["query"] if hybrid else None,
+        )
+        search_ms.append((time.perf_counter() - t0) * 1000)
+
+        got = [str(r.id) for r in res]
+        t0 = time.perf_counter()
+        if res:
+            client.retrieve(collection_name=collection, ids=[r.id for r in res], with_payload=["filename", "caption"])
+        payload_ms.append((time.perf_counter() - t0) * 1000)
+
+        for name, value in quality(got, rec["relevant"], k).items():
+            scores[name].append(value)
+
+    return {
+        **{name: sum(vals) / len(vals) for name, vals in scores.items()},
+        "latency_ms": {"search": summarize(search_ms), "payload": summarize(payload_ms)},
+    }
+
+
+def _config_key(r: Dict[str, Any]) -> str:
+    return f"{r['quantization']}|ef={r['ef']}|k={r['k']}|{r['mode']}"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Human-readable regressions of `current` against `baseline` (matching configurations only)."""
+    base = {_config_key(r): r for r in baseline.get("results", [])}
+    problems: List[str] = []
+    for r in current["results"]:
+        b = base.get(_config_key(r))
+        if b is None:
+            continue
+        for metric in ("recall", "mrr", "ndcg"):
+            if r[metric] < b[metric] - QUALITY_TOL:
+                problems.append(f"{_config_key(r)}: {metric} {b[metric]:.3f} -> {r[metric]:.3f}")
+        for stage in ("search", "payload"):
+            old = b["latency_ms"][stage].get("p95", 0.0)
+            new = r["latency_ms"][stage].get("p95", 0.0)
+            if new > LATENCY_FLOOR_MS and new > old * (1 + LATENCY_TOL):
+                problems.append(f"{_config_key(r)}: {stage} p95 {old:.2f} -> {new:.2f} ms")
+    return problems
+
+
+def main(
+    efs: List[Optional[int]],
+    modes: List[str],
+    ks: List[int],
+    hybrid: bool = True,
+    queries_path: Path = QUERIES_PATH,
+    out: Optional[Path] = None,
+    baseline: Optional[Path] = None,
+    keep: bool = False,
+) -> int:
+    qdrant = get_qdrant_client()
+    ensure_collection_exists(qdrant)
+    if not queries_path.exists():
+        print(f"No query set at {queries_path}. Create one with --build N.")
+        return 1
+    queries = load_queries(queries_path)
+    if not queries:
+        print(f"{queries_path} has no usable queries (need 'query' and 'relevant').")
+        return 1
+    if is_local(qdrant) and (len(efs) > 1 or modes != ["none"]):
+        print("Warning: local Qdrant is exact and ignores ef/quantization; sweeps will only show noise.")
+
+    dim = collection_vector_size(qdrant)
+    embed_ms: List[float] = []
+    vectors: List[List[float]] = []
+    for rec in queries:
+        t0 = time.perf_counter()
+        vectors.append(embed_text(rec["query"], dimensions=dim))
+        embed_ms.append((time.perf_counter() - t0) * 1000)
+
+    source = resolve_alias(qdrant, settings.qdrant_collection)
+    hybrid = hybrid and settings.hybrid_search
+    results: List[Dict[str, Any]] = []
+    created: List[str] = []
+    try:
+        for mode in modes:
+            if mode == "none":
+                collection = source
+            else:
+                collection = _copy_quantized(qdrant, source, mode, dim)
+                created.append(collection)
+            for ef in efs:
+                for k in ks:
+                    r = run_config(qdrant, collection, queries, vectors, k, ef, hybrid)
+                    results.append(
+                        {"quantization": mode, "ef": ef, "k": k, "mode": "hybrid" if hybrid else "dense", **r}
+                    )
+    finally:
+        if not keep:
+            for name in created:
+                try:
+                    qdrant.delete_collection(name)
+                except Exception:
+                    pass
+
+    report = {
+        "ts": int(time.time()),
+        "collection": source,
+        "points": qdrant.count(collection_name=source, exact=True).count,
+        "queries": len(queries),
+        "query_set": str(queries_path),
+        "embedding_provider": settings.embedding_provider,
+        "embedding_model": settings.embedding_model,
+        "dim": dim,
+        "local": is_local(qdrant),
+        "settings": {
+            "hnsw_m": settings.hnsw_m,
+            "hnsw_ef_construct": settings.hnsw_ef_construct,
+            "search_hnsw_ef": settings.search_hnsw_ef,
+            "search_oversampling": settings.search_oversampling,
+            "search_rescore": settings.search_rescore,
+            "hybrid_prefetch_limit": settings.hybrid_prefetch_limit,
+        },
+        "embed_ms": summarize(embed_ms),
+        "embedding_cache": embedding_cache_stats(),
+        "results": results,
+    }
+
+    print(f"{len(queries)} queries | {report['points']} points | embed p50 {report['embed_ms']['p50']:.1f} ms")
+    print(f"{'quant':<7} {'ef':>5} {'k':>3} {'recall':>7} {'MRR':>6} {'nDCG':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'fetch95':>8}")
+    for r in results:
+        s, p = r["latency_ms"]["search"], r["latency_ms"]["payload"]
+        print(
+            f"{r['quantization']:<7} {str(r['ef'] or '-'):>5} {r['k']:>3} {r['recall']:7.3f} {r['mrr']:6.3f} "
+            f"{r['ndcg']:6.3f} {s['p50']:7.2f} {s['p95']:7.2f} {s['p99']:7.2f} {p['p95']:8.2f}"
+        )
+
+    out = out or BENCH_DIR / f"results-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Saved {out}")
+
+    if baseline is not None:
+        problems = compare(report, json.loads(baseline.read_text(encoding="utf-8")))
+        if problems:
+            print(f"Regressions vs {baseline}:")
+            for line in problems:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions vs {baseline}.")
+    return 0
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark retrieval quality and latency.")
+    ap.add_argument("--build", type=int, default=0, help="(re)create the query set from N random captioned points")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--queries", type=Path, default=QUERIES_PATH, help="JSONL query set")
+    ap.add_argument("--ef", default="", help="comma-separated HNSW ef values (default: SEARCH_HNSW_EF)")
+    ap.add_argument("--quantization", default="none", help="comma-separated: none,scalar,binary")
+    ap.add_argument("--k", default="10", help="comma-separated top_k values")
+    ap.add_argument("--dense-only", action="store_true", help="skip the BM25 half of hybrid search")
+    ap.add_argument("--out", type=Path, default=None, help="JSON report path (default: data/bench/results-<time>.json)")
+    ap.add_argument("--baseline", type=Path, default=None, help="earlier report to check for regressions")
+    ap.add_argument("--keep", action="store_true", help="keep the temporary quantized collections")
+    args = ap.parse_args()
+
+    if args.build:
+        client = get_qdrant_client()
+        ensure_collection_exists(client)
+        print(f"Wrote {build_queries(client, args.build, args.seed, args.queries)} queries to {args.queries}")
+        sys.exit(0)
+    sys.exit(
+        main(
+            efs=_int_list(args.ef) or [None],
+            modes=[m.strip() for m in args.quantization.split(",") if m.strip()] or ["none"],
+            ks=_int_list(args.k) or [10],
+            hybrid=not args.dense_only,
+            queries_path=args.queries,
+            out=args.out,
+            baseline=args.baseline,
+            keep=args.keep,
+        )
+    )
@@ -0,0 +1,144 @@
+"""Run many text queries against the collection: JSONL in, JSONL out.
+
+Each input line is a JSON object:
+    {"id": "q1", "query": "red car at night", "top_k": 10, "source": "Stock"}
+Only "query" is required; "top_k" defaults to --top-k and "source" ("All" | "Stock" |
+"User uploads") to All. Plain-text lines are accepted as bare queries.
+
+Queries are embedded in batches (one embeddings request per --batch) and searched with one
+Qdrant batch request per batch, while the next batch is already being embedded. Results are
+written as soon as each batch finishes, so the output can be tailed and a long run keeps
+what it has done:
+    {"id": "q1", "query": "...", "results": [{"id": ..., "score": ..., "filename": ..., "caption": ...}]}
+
+Usage:
+    python scripts/bulk_query.py --input queries.jsonl [--output results.jsonl] [--batch 256] [--top-k 10] [--dense-only]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from src.config import settings
+from src.features.embedding import embed_texts, embedding_cache_stats
+from src.services.qdrant_service import (
+    build_source_filter,
+    collection_vector_size,
+    ensure_collection_exists,
+    get_qdrant_client,
+    search_many,
+)
+
+
+def _read_queries(fh: IO[str]) -> Iterator[Dict[str, Any]]:
+    for n, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            rec = line
+        if isinstance(rec, str):
+            rec = {"query": rec}
+        if not isinstance(rec, dict) or not str(rec.get("query") or "").strip():
+            print(f"line {n}: no query, skipped", file=sys.stderr)
+            continue
+        rec.setdefault("id", n)
+        yield rec
+
+
+def _chunks(it: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for rec in it:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main(
+    input_path: str,
+    output_path: Optional[str] = None,
+    batch_size: int = 256,
+    top_k: int = 10,
+    hybrid: bool = True,
+) -> None:
+    qdrant = get_qdrant_client()
+    ensure_collection_exists(qdrant)
+    dim = collection_vector_size(qdrant)
+
+    fin = open(input_path, encoding="utf-8") if input_path != "-" else sys.stdin
+    fout = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    done = 0
+    t0 = time.time()
+
+    def embed(chunk: List[Dict[str, Any]]) -> List[List[float]]:
+        return embed_texts([str(rec["query"]) for rec in chunk], dimensions=dim)
+
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed") as pool:
+            chunks = _chunks(_read_queries(fin), max(1, batch_size))
+            chunk = next(chunks, None)
+            pending = pool.submit(embed, chunk) if chunk else None
+            while chunk:
+                vectors = pending.result()
+                nxt = next(chunks, None)
+                pending = pool.submit(embed, nxt) if nxt else None  # overlap embedding with search
+
+                results = search_many(
+                    qdrant,
+                    vectors,
+                    top_k=[int(rec.get("top_k") or top_k) for rec in chunk],
+                    qfilters=[build_source_filter(rec.get("source")) for rec in chunk],
+                    texts=[str(rec["query"]) for rec in chunk] if hybrid else None,
+                    with_payload=["filename", "caption"],
+                )
+                for rec, res in zip(chunk, results):
+                    out = {
+                        "id": rec["id"],
+                        "query": rec["query"],
+                        "results": [
+                            {
+                                "id": str(r.id),
+                                "score": float(r.score),
+                                "filename": (r.payload or {}).get("filename"),
+                                "caption": (r.payload or {}).get("caption"),
+                            }
+                            for r in res
+                        ],
+                    }
+                    fout.write(json.dumps(out, ensure_ascii=False) + "\n")
+                fout.flush()
+
+                done += len(chunk)
+                elapsed = time.time() - t0
+                print(f"{done} queries | {done / max(elapsed, 1e-9):.1f} q/s", file=sys.stderr)
+                chunk = nxt
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+    mode = "hybrid" if hybrid and settings.hybrid_search else "dense"
+    print(f"Done: {done} queries ({mode}) in {time.time() - t0:.1f}s", file=sys.stderr)
+    print(f"Embedding cache: {embedding_cache_stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Batch text search: JSONL queries in, JSONL results out.")
+    ap.add_argument("--input", required=True, help="JSONL file with queries ('-' for stdin)")
+    ap.add_argument("--output", default=None, help="JSONL file for results (default: stdout)")
+    ap.add_argument("--batch", type=int, default=256, help="queries per embeddings / Qdrant batch request")
+    ap.add_argument("--top-k", type=int, default=10, help="results per query (unless the line sets top_k)")
+    ap.add_argument("--dense-only", action="store_true", help="skip the BM25 half of hybrid search")
+    args = ap.parse_args()
+    main(args.input, args.output, args.batch, args.top_k, not args.dense_only)
@@ -20,8 +20,14 @@ import random
 from typing import List
 
 from src.config import settings
-from src.features.embedding import embed_text
-from src.services.qdrant_service import get_qdrant_client, ensure_collection_exists, list_points, search
+from src.features.embedding import embed_texts, embedding_cache_stats
+from src.services.qdrant_service import (
+    collection_vector_size,
+    ensure_collection_exists,
+    get_qdrant_client,
+    list_points,
+    search_many,
+)
 
 
 def main(sample_n: int = 20, k: int = 10, seed: int = 42) -> None:
@@ -43,16 +49,19 @@ def main(sample_n: int = 20, k: int = 10, seed: int = 42) -> None:
     picks = random.sample(candidates, k=min(sample_n, len(candidates)))
     hits = 0
 
-    for it in picks:
+    qvecs = embed_texts(
+        [(it.get("payload") or {}).get("caption", "") for it in picks],
+        dimensions=collection_vector_size(qdrant),
+    )
+    results = search_many(qdrant, qvecs, top_k=k, with_payload=False)
+    for it, res in zip(picks, results):
         pid = it.get("id")
-        cap = (it.get("payload") or {}).get("caption", "")
-        qvec = embed_text(cap)
-        res = search(qdrant, qvec, top_k=k)
         got_ids = [str(r.id) for r in res]
         if pid in got_ids:
             hits += 1
 
     print(f"Self-retrieval hit@{k}: {hits}/{len(picks)} = {hits/len(picks):.2%}")
+    print(f"Embedding cache: {embedding_cache_stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+"""Re-embed the collection at a new vector size and switch the app over without downtime.
+
+Stored captions are re-embedded (no VLM calls) into a fresh collection while the app keeps
+serving the old one. Ids and payloads are copied unchanged, so thumbnails, phash and history
+links stay valid. Points without a caption keep their vectors when the size is unchanged;
+otherwise the run stops before switching (unless --drop-uncaptioned). Uploads made during the
+copy are picked up by catch-up passes over `added_at`, and points edited meanwhile (caption,
+tags) by comparing payloads; passes repeat until one finds nothing. Then the alias the app
+reads (QDRANT_COLLECTION) is moved to the new collection in one atomic request, and the app
+re-reads the vector size on its next query (see collection_vector_size).
+
+The app must address the collection through an alias. If QDRANT_COLLECTION still names a
+real collection, pass e.g. `--alias image_finder_live` and set QDRANT_COLLECTION to it after
+the run (one restart; every later migration is switch-over only).
+
+Usage:
+    python scripts/migrate_collection.py --dim 512 [--alias NAME] [--target NAME] [--concurrency 4] [--drop-old]
+        [--drop-uncaptioned]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from qdrant_client.models import FieldCondition, Filter, HasIdCondition, PointIdsList, Range
+
+from src.config import settings
+from src.features.embedding import embed_texts, supports_dimensions
+from src.services.qdrant_service import (
+    collection_vector_size,
+    dense_vector,
+    ensure_collection_exists,
+    existing_ids,
+    get_qdrant_client,
+    is_local,
+    iter_points,
+    resolve_alias,
+    switch_alias,
+    upsert_points,
+)
+
+
+def _is_collection(client, name: str) -> bool:
+    return any(c.name == name for c in client.get_collections().collections)
+
+
+def main(
+    dim: int,
+    alias: Optional[str] = None,
+    target: Optional[str] = None,
+    batch_size: int = 256,
+    concurrency: int = 4,
+    drop_old: bool = False,
+    drop_uncaptioned: bool = False,
+) -> None:
+    if dim != settings.embedding_dim and not supports_dimensions():
+        print(f"{settings.embedding_model} does not support shortened embeddings; use a text-embedding-3 model.")
+        return
+
+    qdrant = get_qdrant_client()
+    alias = alias or settings.qdrant_collection
+    source = resolve_alias(qdrant, settings.qdrant_collection)
+    if not qdrant.collection_exists(source):
+        print(f"Collection '{source}' does not exist. Nothing to migrate.")
+        return
+    if _is_collection(qdrant, alias):
+        print(
+            f"'{alias}' is a collection, not an alias. Re-run with --alias {alias}_live and set "
+            f"QDRANT_COLLECTION={alias}_live afterwards."
+        )
+        return
+
+    target = target or f"{alias}_d{dim}_{time.strftime('%Y%m%d%H%M%S')}"
+    if _is_collection(qdrant, target):
+        print(f"Target collection '{target}' already exists; pick another --target.")
+        return
+    ensure_collection_exists(qdrant, collection_name=target, vector_size=dim)
+
+    if is_local(qdrant):
+        concurrency = 1  # embedded Qdrant is not safe for concurrent writes
+    same_dim = dim == collection_vector_size(qdrant, source)
+    total = qdrant.count(collection_name=source, exact=True).count
+    counts = {"migrated": 0, "deleted": 0, "updated": 0}
+    copied: Set[str] = set()
+    no_caption: Set[str] = set()  # ids copied without a caption ...
+    carried: Set[str] = set()  # ... and those of them whose vectors were carried over
+    high_water = {"added_at": 0}
+    t0 = time.time()
+
+    def migrate(batch: List[Tuple[Any, str, Dict[str, Any]]]) -> int:
+        vectors = embed_texts([caption for _, caption, _ in batch], dimensions=dim)
+        return upsert_points(
+            qdrant,
+            [(pid, vec, payload) for (pid, _, payload), vec in zip(batch, vectors)],
+            collection_name=target,
+        )
+
+    def carry(ids: List[Any]) -> None:
+        """Points without a caption can't be re-embedded: copy their vectors as they are."""
+        for i in range(0, len(ids), batch_size):
+            recs = qdrant.retrieve(source, ids=ids[i : i + batch_size], with_payload=True, with_vectors=True)
+            recs = [r for r in recs if dense_vector(r.vector)]
+            upsert_points(qdrant, [(r.id, dense_vector(r.vector), r.payload or {}) for r in recs], collection_name=target)
+            carried.update(str(r.id) for r in recs)
+
+    def drain(pending: Set[Future], block_until: int) -> Set[Future]:
+        while len(pending) > block_until:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                counts["migrated"] += fut.result()  # re-raise: never switch over a partial copy
+            rate = counts["migrated"] / max(1e-6, time.time() - t0)
+            print(f"\r{counts['migrated']}/{total} points ({rate:.0f}/s)", end="", flush=True)
+        return pending
+
+    def sync(qfilter: Optional[Filter] = None) -> int:
+        """Copy every source point not copied yet; returns how many were new."""
+        new = 0
+        uncaptioned: List[Any] = []
+        batch: List[Tuple[Any, str, Dict[str, Any]]] = []
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for rec in iter_points(qdrant, with_payload=True, qfilter=qfilter, batch_size=batch_size, collection_name=source):
+                if str(rec.id) in copied:
+                    continue
+                copied.add(str(rec.id))
+                new += 1
+                payload = rec.payload or {}
+                high_water["added_at"] = max(high_water["added_at"], int(payload.get("added_at") or 0))
+                caption = str(payload.get("caption") or "").strip()
+                if not caption:
+                    no_caption.add(str(rec.id))
+                    uncaptioned.append(rec.id)
+                    continue
+                no_caption.discard(str(rec.id))
+                carried.discard(str(rec.id))
+                batch.append((rec.id, caption, payload))
+                if len(batch) >= batch_size:
+                    pending.add(pool.submit(migrate, batch))
+                    batch = []
+                    pending = drain(pending, concurrency)
+            if batch:
+                pending.add(pool.submit(migrate, batch))
+            drain(pending, 0)
+        if uncaptioned and same_dim:
+            carry(uncaptioned)
+        return new
+
+    def changed_since_copy() -> List[Any]:
+        """Ids of copied points whose payload was edited in the source since (caption, tags, ...)."""
+        ids: List[Any] = []
+        recs = iter_points(qdrant, with_payload=True, batch_size=batch_size, collection_name=source)
+        while True:
+            chunk = [r for r in islice(recs, batch_size) if str(r.id) in copied]
+            if not chunk:
+                return ids
+            have = {
+                str(r.id): r.payload or {}
+                for r in qdrant.retrieve(target, ids=[r.id for r in chunk], with_payload=True, with_vectors=False)
+            }
+            ids.extend(r.id for r in chunk if str(r.id) in have and have[str(r.id)] != (r.payload or {}))
+
+    def uncaptioned_check() -> bool:
+        lost = len(no_caption - carried)
+        if lost and not drop_uncaptioned:
+            print(
+                f"\n{lost} points have no caption and can't be re-embedded at {dim} dims. "
+                f"Caption them first, or pass --drop-uncaptioned. Alias left on '{source}'."
+            )
+            return False
+        return True
+
+    def catch_up() -> None:
+        """Points the app added or edited while we copied; repeat until a pass finds nothing."""
+        while True:
+            since = Filter(must=[FieldCondition(key="added_at", range=Range(gte=high_water["added_at"]))])
+            new = sync(since)
+            edited = changed_since_copy()
+            if edited:
+                copied.difference_update(str(pid) for pid in edited)
+                sync(Filter(must=[HasIdCondition(has_id=edited)]))
+                counts["updated"] += len(edited)
+            if not new and not edited:
+                return
+            print(f"\ncatch-up: {new} points added, {len(edited)} edited during the copy")
+
+    sync()
+    if not uncaptioned_check():
+        return
+    catch_up()
+    print()
+
+    # Points deleted from the source during the copy must not come back after the switch.
+    gone = sorted(copied - existing_ids(qdrant, copied, collection_name=source))
+    if gone:
+        qdrant.delete(collection_name=target, points_selector=PointIdsList(points=[int(x) if x.isdigit() else x for x in gone]))
+        counts["deleted"] = len(gone)
+        no_caption.difference_update(gone)
+    # Catch-up may have copied (or un-captioned) points whose vectors can't be carried over.
+    if not uncaptioned_check():
+        return
+    uncaptioned_lost = len(no_caption - carried)
+
+    copied_count = qdrant.count(collection_name=target, exact=True).count
+    expected = qdrant.count(collection_name=source, exact=True).count - (uncaptioned_lost if drop_uncaptioned else 0)
+    if copied_count != expected:
+        print(f"Target has {copied_count} points, source has {expected} to migrate. Alias left on '{source}'.")
+        return
+
+    switch_alias(qdrant, alias, target)
+    # Writes already in flight to the old collection when the alias moved.
+    late = sync(Filter(must=[FieldCondition(key="added_at", range=Range(gte=high_water["added_at"]))]))
+    print(
+        f"Alias '{alias}' -> '{target}' ({dim} dims) | migrated={counts['migrated']}, "
+        f"carried={len(carried)} (no caption, vectors copied), dropped={uncaptioned_lost} (no caption), "
+        f"edited during copy={counts['updated']}, deleted during copy={counts['deleted']}, late={late}, "
+        f"elapsed={time.time() - t0:.1f}s"
+    )
+    if drop_old and source != settings.qdrant_collection:  # the app may still read it directly
+        qdrant.delete_collection(source)
+        print(f"Dropped old collection '{source}'.")
+    else:
+        print(f"Old collection '{source}' kept for rollback (scripts/migrate_collection.py --drop-old deletes it).")
+    if dim != settings.embedding_dim:
+        print(f"Set EMBEDDING_DIM={dim} in .env so newly created collections match.")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Re-embed captions into a new collection and switch the alias.")
+    ap.add_argument("--dim", type=int, default=settings.embedding_dim, help="target vector size")
+    ap.add_argument("--alias", default=None, help="alias the app reads (default: QDRANT_COLLECTION)")
+    ap.add_argument("--target", default=None, help="name of the new collection")
+    ap.add_argument("--batch", type=int, default=256, help="captions per embeddings request")
+    ap.add_argument("--concurrency", type=int, default=4, help="batches in flight")
+    ap.add_argument("--drop-old", action="store_true", help="delete the previous collection after the switch")
+    ap.add_argument(
+        "--drop-uncaptioned",
+        action="store_true",
+        help="switch even if points without a caption can't be carried over (vector size changes)",
+    )
+    args = ap.parse_args()
+    main(args.dim, args.alias, args.target, args.batch, args.concurrency, args.drop_old, args.drop_uncaptioned)
@@ -1,19 +1,69 @@
+"""Index the stock images in data/images.
+
+Incremental by default: a local manifest (path -> size, mtime, point id) lets unchanged
+files skip even decoding, and new/changed files are checked against Qdrant by id (and
+against the perceptual-hash index for near-duplicates) before any VLM/embedding call.
+Every indexed file is also appended to a checkpoint log, so an interrupted run picks up
+where it stopped.
+
+Usage:
+    python scripts/seed_stock.py            # incremental
+    python scripts/seed_stock.py --full     # re-index everything
+    python scripts/seed_stock.py --prune    # also delete points of files removed from disk
+"""
+
 from __future__ import annotations
 
-import time
+import argparse
+import json
+import threading
 from pathlib import Path
+from typing import Any, Dict
 
-from PIL import Image
-
-from src.features.embedding import embed_text
-from src.features.vision import describe_image, pil_to_png_bytes, parse_caption_and_tags
-from src.services.qdrant_service import get_qdrant_client, ensure_collection_exists, upsert_point
-from src.utils.ids import stable_id_from_bytes
+from src.features.embedding import embedding_cache_stats
+from src.features.ingest import IngestItem, IngestPipeline, format_stats
+from src.features.vision import caption_cache_stats
+from src.services.qdrant_service import delete_points, get_qdrant_client, ensure_collection_exists
 
 DATA_DIR = Path("data/images")
+MANIFEST_PATH = Path("data/seed_manifest.json")
+CHECKPOINT_PATH = Path("data/seed_checkpoint.jsonl")
+
+
+def _load_manifest() -> Dict[str, Dict[str, Any]]:
+    manifest: Dict[str, Dict[str, Any]] = {}
+    if MANIFEST_PATH.exists():
+        try:
+            data = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                manifest = data
+        except Exception:
+            manifest = {}
+    # Fold in entries written by an interrupted previous run.
+    if CHECKPOINT_PATH.exists():
+        for line in CHECKPOINT_PATH.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+                manifest[rec.pop("path")] = rec
+            except Exception:
+                continue  # tolerate a torn last line after a hard kill
+    return manifest
+
+
+def _as_point_id(pid: str) -> Any:
+    """Skip reasons carry ids as strings; the manifest stores numeric ids as ints."""
+    return int(pid) if pid.isdigit() else pid
+
 
+def _save_manifest(manifest: Dict[str, Dict[str, Any]]) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(MANIFEST_PATH)
+    CHECKPOINT_PATH.unlink(missing_ok=True)
 
-def main() -> None:
+
+def main(full: bool = False, prune: bool = False) -> None:
     qdrant = get_qdrant_client()
     ensure_collection_exists(qdrant)
 
@@ -24,30 +74,102 @@ def main() -> None:
         print(f"No images found in {DATA_DIR.resolve()}. Put some JPG/PNG files there first.")
         return
 
-    print(f"Seeding {len(files)} images from {DATA_DIR.resolve()} ...")
+    manifest = _load_manifest()
+    present = {str(p) for p in files}
+    removed = sorted(k for k in manifest if k not in present)
 
+    summary = {
+        "new": 0,
+        "changed": 0,
+        "unchanged": 0,
+        "already_indexed": 0,
+        "near_duplicate": 0,
+        "removed": len(removed),
+        "failed": 0,
+    }
+    todo = []
+    stat_of: Dict[str, Dict[str, Any]] = {}
     for p in files:
-        img = Image.open(p).convert("RGB")
-        img_bytes = pil_to_png_bytes(img)
-        pid = stable_id_from_bytes(img_bytes)
-
-        raw = describe_image(img_bytes)
-        caption, tags = parse_caption_and_tags(raw)
-        vector = embed_text(caption)
-
-        payload = {
-            "filename": str(p),
-            "caption": caption,
-            "tags": tags,
-            "source": "seed",
-            "stock": True,
-            "added_at": int(time.time()),
-        }
-        upsert_point(qdrant, pid, vector, payload)
-        print(f"Indexed: {p.name} -> id={pid}")
+        st = p.stat()
+        stat_of[str(p)] = {"size": st.st_size, "mtime": st.st_mtime_ns}
+        old = manifest.get(str(p))
+        if not full and old and old.get("size") == st.st_size and old.get("mtime") == st.st_mtime_ns and old.get("id") is not None:
+            summary["unchanged"] += 1
+            continue
+        summary["changed" if old else "new"] += 1
+        todo.append(p)
+
+    print(f"Seeding {len(todo)} of {len(files)} images from {DATA_DIR.resolve()} ...")
+
+    lock = threading.Lock()
+    stale_ids = []
+
+    def record(item: IngestItem, point_id: Any) -> None:
+        key = str(item.path)
+        rec = dict(stat_of[key], id=point_id)
+        with lock:
+            old = manifest.get(key)
+            if old and old.get("id") is not None and old["id"] != point_id:
+                stale_ids.append(old["id"])
+            manifest[key] = rec
+            ckpt.write(json.dumps(dict(rec, path=key)) + "\n")
+            ckpt.flush()
+
+    def on_done(item: IngestItem) -> None:
+        record(item, item.point_id)
+        print(f"Indexed: {item.path.name} -> id={item.point_id}")
+
+    def on_skip(item: IngestItem) -> None:
+        # A near-duplicate (e.g. the same photo re-encoded) is served by the existing point:
+        # that is this file's id now, so the point must not be deleted as stale below.
+        near = item.duplicate_of != str(item.point_id)
+        record(item, _as_point_id(item.duplicate_of) if near else item.point_id)
+        with lock:
+            summary["near_duplicate" if near else "already_indexed"] += 1
+        if near:
+            print(f"Skipped: {item.path.name} already indexed as id={item.duplicate_of}")
+
+    def on_error(item: IngestItem, exc: Exception) -> None:
+        print(f"FAILED [{item.stage}]: {item.path.name}: {exc}")
+
+    CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with CHECKPOINT_PATH.open("a", encoding="utf-8") as ckpt:
+        pipeline = IngestPipeline(
+            qdrant,
+            on_done=on_done,
+            on_error=on_error,
+            on_skip=on_skip,
+            skip_existing=not full,
+            report=lambda s: print(f"[progress] {format_stats(s)}"),
+            wait_upserts=False,
+        )
+        stats = pipeline.run(
+            IngestItem(path=p, payload={"filename": str(p), "source": "seed", "stock": True}) for p in todo
+        )
+    summary["failed"] = stats["failed"]
+
+    # Removed files stay in the manifest (and in Qdrant) until --prune, so they keep being reported.
+    removed_ids = [manifest.pop(k).get("id") for k in removed] if prune else []
+    # A changed file gets a new content id: drop its old point unless another file still uses it.
+    live_ids = {rec.get("id") for rec in manifest.values()}
+    to_delete = [pid for pid in stale_ids + removed_ids if pid is not None and pid not in live_ids]
+    if to_delete:
+        delete_points(qdrant, sorted(set(to_delete)))
+    _save_manifest(manifest)
 
+    print("Summary: " + ", ".join(f"{k}={v}" for k, v in summary.items()))
+    if to_delete:
+        print(f"Deleted {len(set(to_delete))} stale points.")
+    if summary["failed"]:
+        print("Some images failed; re-run to retry only those.")
+    print(f"Caption cache: {caption_cache_stats()}")
+    print(f"Embedding cache: {embedding_cache_stats()}")
     print("Done.")
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Index the stock images in data/images.")
+    ap.add_argument("--full", action="store_true", help="ignore the manifest and re-index every file")
+    ap.add_argument("--prune", action="store_true", help="delete points of files that disappeared from disk")
+    args = ap.parse_args()
+    main(full=args.full, prune=args.prune)
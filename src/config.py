@@ -15,16 +15,107 @@ class Settings:
     qdrant_api_key: str = os.getenv("QDRANT_API_KEY", "")
     qdrant_collection: str = os.getenv("QDRANT_COLLECTION", "image_finder")
 
+    # Collection tuning (applied on create, reconciled at startup; ignored by local mode)
+    hnsw_m: int = int(os.getenv("HNSW_M", "16"))
+    hnsw_ef_construct: int = int(os.getenv("HNSW_EF_CONSTRUCT", "100"))
+    hnsw_full_scan_threshold: int = int(os.getenv("HNSW_FULL_SCAN_THRESHOLD", "10000"))
+    optimizer_indexing_threshold: int = int(os.getenv("OPTIMIZER_INDEXING_THRESHOLD", "20000"))
+    # 0 = let Qdrant pick (number of CPUs)
+    optimizer_default_segment_number: int = int(os.getenv("OPTIMIZER_DEFAULT_SEGMENT_NUMBER", "0"))
+
     # OpenAI
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # Shared HTTP pool for the process-wide client (src/services/openai_client.py)
+    openai_connect_timeout: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    openai_read_timeout: float = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    openai_max_keepalive: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
     # Models (keep aligned with your course project defaults)
     vlm_model: str = os.getenv("VLM_MODEL", "gpt-4o-mini")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
 
+    # Providers (src/services/providers.py): openai | local (deterministic, offline) | replay (recorded)
+    embedding_provider: str = os.getenv("EMBEDDING_PROVIDER", "openai")
+    caption_provider: str = os.getenv("CAPTION_PROVIDER", "openai")
+    # Record live provider responses to REPLAY_DIR for later replay
+    provider_record: bool = os.getenv("PROVIDER_RECORD", "0") in {"1", "true", "True"}
+    replay_dir: str = os.getenv("REPLAY_DIR", "data/replay")
+    # Fault injection for the local providers (load tests)
+    local_latency_ms: float = float(os.getenv("LOCAL_LATENCY_MS", "0"))
+    local_error_rate: float = float(os.getenv("LOCAL_ERROR_RATE", "0"))
+
+    # Image sent to the VLM (src/features/preprocess.py): JPEG | WEBP | PNG
+    vlm_image_format: str = os.getenv("VLM_IMAGE_FORMAT", "JPEG")
+    vlm_image_quality: int = int(os.getenv("VLM_IMAGE_QUALITY", "85"))
+    vlm_max_side: int = int(os.getenv("VLM_MAX_SIDE", "1024"))
+
     # Embedding dimension for text-embedding-3-large is 3072 (keep consistent with collection config)
     embedding_dim: int = int(os.getenv("EMBEDDING_DIM", "3072"))
 
+    # Batched embeddings (embed_texts): max inputs and estimated tokens per request
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    embedding_batch_max_tokens: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+
+    # Embedding cache (data/cache/embeddings.sqlite); dtype: float32 | float16
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "1") not in {"0", "false", "False"}
+    embedding_cache_max_items: int = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", "50000"))
+    embedding_cache_dtype: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+
+    # VLM caption cache (data/cache/captions.sqlite), keyed by image content id
+    caption_cache_enabled: bool = os.getenv("CAPTION_CACHE_ENABLED", "1") not in {"0", "false", "False"}
+    caption_cache_max_items: int = int(os.getenv("CAPTION_CACHE_MAX_ITEMS", "20000"))
+
+    # Vector storage / quantization: QUANTIZATION = none | scalar (int8) | binary
+    quantization: str = os.getenv("QUANTIZATION", "none")
+    quantization_always_ram: bool = os.getenv("QUANTIZATION_ALWAYS_RAM", "1") not in {"0", "false", "False"}
+    vectors_on_disk: bool = os.getenv("VECTORS_ON_DISK", "0") in {"1", "true", "True"}
+    # Query time: oversample quantized candidates, then rescore with original vectors
+    search_oversampling: float = float(os.getenv("SEARCH_OVERSAMPLING", "2.0"))
+    search_rescore: bool = os.getenv("SEARCH_RESCORE", "1") not in {"0", "false", "False"}
+    # 0 = server default ef
+    search_hnsw_ef: int = int(os.getenv("SEARCH_HNSW_EF", "0"))
+
+    # Bulk upsert (qdrant_service.upsert_points)
+    upsert_batch_size: int = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+    upsert_max_bytes: int = int(os.getenv("UPSERT_MAX_BYTES", "8000000"))
+    upsert_parallel: int = int(os.getenv("UPSERT_PARALLEL", "1"))
+
+    # Ingestion pipeline (seed script / bulk indexing)
+    ingest_cpu_workers: int = int(os.getenv("INGEST_CPU_WORKERS", "2"))
+    ingest_vlm_workers: int = int(os.getenv("INGEST_VLM_WORKERS", "4"))
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+    ingest_queue_size: int = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+
+    # Background jobs started from the UI (src/features/jobs.py)
+    job_workers: int = int(os.getenv("JOB_WORKERS", "4"))
+
+    # Pending-upload retry worker (src/features/pending_worker.py)
+    pending_workers: int = int(os.getenv("PENDING_WORKERS", "2"))
+    pending_batch_size: int = int(os.getenv("PENDING_BATCH_SIZE", "64"))
+    pending_poll_s: float = float(os.getenv("PENDING_POLL_S", "5"))
+    pending_backoff_base_s: float = float(os.getenv("PENDING_BACKOFF_BASE_S", "15"))
+    pending_backoff_max_s: float = float(os.getenv("PENDING_BACKOFF_MAX_S", "900"))
+
+    # Hybrid retrieval: dense + BM25 sparse vector fused with RRF (needs the sparse vector in the collection)
+    hybrid_search: bool = os.getenv("HYBRID_SEARCH", "1") not in {"0", "false", "False"}
+    hybrid_prefetch_limit: int = int(os.getenv("HYBRID_PREFETCH_LIMIT", "50"))
+
+    # Search result cache (in-process; invalidated by any Qdrant write via src/utils/versions)
+    search_cache_enabled: bool = os.getenv("SEARCH_CACHE_ENABLED", "1") not in {"0", "false", "False"}
+    search_cache_ttl_s: float = float(os.getenv("SEARCH_CACHE_TTL_S", "600"))
+    search_cache_max_items: int = int(os.getenv("SEARCH_CACHE_MAX_ITEMS", "512"))
+
+    # Thumbnails for gallery/search grids (data/cache/thumbs)
+    thumb_size: int = int(os.getenv("THUMB_SIZE", "384"))
+    thumb_format: str = os.getenv("THUMB_FORMAT", "WEBP")
+    thumb_quality: int = int(os.getenv("THUMB_QUALITY", "80"))
+    thumb_cache_max_mb: int = int(os.getenv("THUMB_CACHE_MAX_MB", "500"))
+
+    # Near-duplicate detection: max Hamming distance between 64-bit dHashes (-1 disables)
+    phash_radius: int = int(os.getenv("PHASH_RADIUS", "6"))
+
     # App behavior
     top_k: int = int(os.getenv("TOP_K", "12"))
 
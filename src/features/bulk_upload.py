@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple
+
+from src.features.ingest import IngestItem, IngestPipeline
+from src.features.jobs import Job
+from src.services.qdrant_service import get_point
+from src.utils.history import append_history
+from src.utils.ids import stable_id_from_digest
+from src.utils.pending import add_pending
+from src.utils.phash import to_hex
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+MAX_MEMBER_BYTES = 50 * 1024 * 1024  # per image inside a zip (guards against zip bombs)
+CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass
+class StagedFile:
+    """An uploaded image persisted under its content id, ready for the pipeline."""
+
+    name: str  # as uploaded (zip members: path inside the archive)
+    path: Path
+    point_id: int
+
+
+def stream_to_disk(src: IO[bytes], dest_dir: Path, ext: str) -> Tuple[Path, int]:
+    """Copy `src` in chunks to dest_dir/<content id><ext>, hashing on the way (no full read into memory)."""
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha1()
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                h.update(chunk)
+                out.write(chunk)
+        point_id = stable_id_from_digest(h.digest())
+        path = dest_dir / f"{point_id}{ext}"
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path, point_id
+
+
+def _iter_images(uploads: Iterable[Any]) -> Iterator[Tuple[str, Any]]:
+    """(name, file object or rejection reason) for every image in the uploads; zips are expanded."""
+    for up in uploads:
+        name = getattr(up, "name", "") or "upload"
+        ext = Path(name).suffix.lower()
+        if ext == ".zip":
+            try:
+                zf = zipfile.ZipFile(up)
+            except zipfile.BadZipFile:
+                yield name, "not a valid zip archive"
+                continue
+            with zf:
+                for info in zf.infolist():
+                    member = info.filename
+                    if info.is_dir() or member.startswith("__MACOSX/") or Path(member).name.startswith("."):
+                        continue
+                    if Path(member).suffix.lower() not in IMAGE_EXTS:
+                        yield f"{name}/{member}", "unsupported file type"
+                    elif info.file_size > MAX_MEMBER_BYTES:
+                        yield f"{name}/{member}", "file too large"
+                    else:
+                        with zf.open(info) as fh:
+                            yield f"{name}/{member}", fh
+        elif ext in IMAGE_EXTS:
+            yield name, up
+        else:
+            yield name, "unsupported file type"
+
+
+def stage_uploads(uploads: Iterable[Any], dest_dir: Path) -> Tuple[List[StagedFile], List[Tuple[str, str]]]:
+    """Persist uploaded images (and zip members) to disk. Returns (staged, [(name, reason)] rejected)."""
+    staged: List[StagedFile] = []
+    rejected: List[Tuple[str, str]] = []
+    seen: set = set()
+    for name, src in _iter_images(uploads):
+        if isinstance(src, str):
+            rejected.append((name, src))
+            continue
+        try:
+            path, point_id = stream_to_disk(src, dest_dir, Path(name).suffix.lower())
+        except Exception as e:
+            rejected.append((name, str(e)[:200]))
+            continue
+        if point_id in seen:
+            rejected.append((name, "same file uploaded twice"))
+            continue
+        seen.add(point_id)
+        staged.append(StagedFile(name=name, path=path, point_id=point_id))
+    return staged, rejected
+
+
+def run_bulk_index(
+    job: Job,
+    qdrant_client,
+    staged: List[StagedFile],
+    rejected: List[Tuple[str, str]],
+) -> Dict[str, Any]:
+    """Job body: push staged files through IngestPipeline, tracking per-file status in `job.result`.
+
+    Files that fail after decoding go to the pending queue (with their caption if the
+    VLM already produced one), so the pending worker finishes them later.
+    """
+    files: Dict[str, Dict[str, Any]] = {
+        str(f.path): {"file": f.name, "id": str(f.point_id), "status": "queued", "detail": ""} for f in staged
+    }
+    for name, reason in rejected:
+        files[f"rejected:{name}"] = {"file": name, "id": "", "status": "rejected", "detail": reason}
+    # All keys exist up front; workers only replace values, so the UI can read it concurrently.
+    job.result["files"] = files
+    job.result["stats"] = {"submitted": len(staged)}
+    job.stage = "indexing"
+
+    def status(item: IngestItem, value: str, detail: str = "") -> None:
+        files[str(item.path)] = dict(files[str(item.path)], status=value, detail=detail)
+
+    def on_done(item: IngestItem) -> None:
+        status(item, "indexed", item.caption[:120])
+
+    def on_skip(item: IngestItem) -> None:
+        status(item, "duplicate", f"already indexed as {item.duplicate_of}")
+        # Staged files are named by content id, so an exact re-upload may have landed on the
+        # indexed point's own file: only delete the copy nothing refers to.
+        try:
+            original = get_point(qdrant_client, item.duplicate_of)
+        except Exception:
+            return  # can't tell; keeping a stray file beats breaking an indexed image
+        kept = original and Path(str(original["payload"].get("filename") or "")).resolve() == item.path.resolve()
+        if not kept:
+            item.path.unlink(missing_ok=True)
+
+    def on_error(item: IngestItem, exc: Exception) -> None:
+        if item.stage == "decode":
+            status(item, "failed", f"unreadable image: {exc}")
+            item.path.unlink(missing_ok=True)
+            return
+        add_pending(
+            {
+                "id": str(item.point_id),
+                "filename": str(item.path),
+                "caption": item.caption,
+                "tags": item.tags,
+                "phash": to_hex(item.phash) if item.phash is not None else "",
+                "source": "user_upload",
+                "error": f"[{item.stage}] {exc}"[:500],
+            }
+        )
+        status(item, "pending", f"{item.stage} failed: {exc}")
+
+    def report(stats: Dict[str, Any]) -> None:
+        job.result["stats"] = stats
+
+    pipeline = IngestPipeline(
+        qdrant_client,
+        on_done=on_done,
+        on_error=on_error,
+        on_skip=on_skip,
+        skip_existing=True,
+        report=report,
+        report_every=1.0,
+    )
+    stats = pipeline.run(
+        IngestItem(
+            path=f.path,
+            point_id=f.point_id,
+            payload={"filename": str(f.path), "source": "user_upload", "stock": False},
+        )
+        for f in staged
+    )
+    counts: Dict[str, int] = {}
+    for rec in files.values():
+        counts[rec["status"]] = counts.get(rec["status"], 0) + 1
+    append_history({"mode": "bulk_add", "status": "finished", **counts, "images_per_s": stats.get("images_per_s")})
+    return {"stats": stats, "counts": counts}
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Optional, Set, Tuple
+
+from src.config import settings
+from src.services.qdrant_service import existing_ids, iter_points
+from src.utils.phash import PhashIndex, from_hex
+from src.utils.versions import QDRANT_DELETES, get_version
+
+_index: Optional[PhashIndex] = None
+_index_version: Optional[int] = None
+# Ids added by this process since the last load (claimed by an ingest run or just upserted):
+# trusted without a Qdrant round trip, because wait=False upserts may not be readable yet.
+_local: Set[str] = set()
+_lock = threading.Lock()
+
+
+def get_phash_index(qdrant_client) -> PhashIndex:
+    """Process-wide perceptual-hash index, loaded from the `phash` payload field.
+
+    The tree can't drop entries, so it is reloaded whenever points were deleted (by any
+    process) since it was built, as tracked by the QDRANT_DELETES version counter.
+    """
+    global _index, _index_version
+    version = get_version(QDRANT_DELETES)
+    if _index is None or (version != -1 and version != _index_version):
+        with _lock:
+            if _index is None or (version != -1 and version != _index_version):
+                index = PhashIndex()
+                try:
+                    for rec in iter_points(qdrant_client, with_payload=["phash"]):
+                        h = from_hex((rec.payload or {}).get("phash"))
+                        if h is not None:
+                            index.add(h, rec.id)
+                    index.loaded = True
+                except Exception:
+                    pass  # no collection yet / Qdrant down: start empty, lookups just miss
+                _index, _index_version = index, version
+                _local.clear()
+    return _index
+
+
+def find_near_duplicate(qdrant_client, h: int, radius: Optional[int] = None) -> Optional[Tuple[str, int]]:
+    """(point_id, distance) of an already indexed near-identical image, or None.
+
+    Candidates not added by this process are confirmed with a `retrieve` first, so a point
+    deleted behind the index's back is never reported as the original.
+    """
+    radius = settings.phash_radius if radius is None else radius
+    if radius < 0:
+        return None
+    hits = get_phash_index(qdrant_client).within(h, radius)
+    if not hits:
+        return None
+    unverified = [pid for pid, _ in hits if pid not in _local]
+    try:
+        alive = existing_ids(qdrant_client, unverified) if unverified else set()
+    except Exception:
+        return hits[0]  # Qdrant unreachable: the index is the best information there is
+    for pid, dist in hits:
+        if pid in _local or pid in alive:
+            return pid, dist
+    return None
+
+
+def remember(qdrant_client, h: Optional[int], point_id: Any) -> None:
+    if h is not None:
+        get_phash_index(qdrant_client).add(h, point_id)
+        _local.add(str(point_id))
+
+
+def forget(point_id: Any) -> None:
+    """Stop trusting a claimed id whose upsert failed (lookups then verify it against Qdrant)."""
+    _local.discard(str(point_id))
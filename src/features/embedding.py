@@ -1,12 +1,122 @@
 from __future__ import annotations
 
-from typing import List
+import hashlib
+import struct
+import unicodedata
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
 
-from src.services.openai_client import get_openai_client
 from src.config import settings
+from src.services.providers import get_embedder
+from src.utils.kv_cache import CACHE_DIR, SqliteLRUCache
+from src.utils.timing import timed
 
 
-def embed_text(text: str) -> List[float]:
-    client = get_openai_client()
-    resp = client.embeddings.create(model=settings.embedding_model, input=text)
-    return resp.data[0].embedding
+# OpenAI embeddings endpoint hard limit on inputs per request (applied to every provider).
+EMBEDDING_MAX_INPUTS = 2048
+
+_cache: Optional[SqliteLRUCache] = None
+
+
+def _get_cache() -> SqliteLRUCache:
+    global _cache
+    if _cache is None:
+        _cache = SqliteLRUCache(CACHE_DIR / "embeddings.sqlite", max_items=settings.embedding_cache_max_items)
+    return _cache
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used both for the cache key and for the API input."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def _cache_namespace(dim: int) -> str:
+    # Provider/model + dimension are part of the key, so changing either invalidates old vectors.
+    return f"{get_embedder().cache_tag}:{dim}"
+
+
+def supports_dimensions() -> bool:
+    """Whether the configured embedder can return vectors of any requested size."""
+    return get_embedder().supports_dimensions()
+
+
+def _cache_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    if settings.embedding_cache_dtype == "float16":
+        return b"e" + struct.pack(f"<{len(vector)}e", *vector)
+    return b"f" + array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    kind, body = blob[:1], blob[1:]
+    if kind == b"e":
+        return list(struct.unpack(f"<{len(body) // 2}e", body))
+    arr = array("f")
+    arr.frombytes(body)
+    return arr.tolist()
+
+
+def embedding_cache_stats() -> Dict[str, int]:
+    return _get_cache().stats()
+
+
+def _estimate_tokens(text: str) -> int:
+    # No tokenizer dependency: ~3 bytes per token is a safe over-estimate for BPE tokenizers.
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def _batches(texts: Sequence[str]) -> Iterator[List[str]]:
+    """Pack texts into request-sized batches (input count + token budget)."""
+    max_items = max(1, min(settings.embedding_batch_size, EMBEDDING_MAX_INPUTS))
+    max_tokens = max(1, settings.embedding_batch_max_tokens)
+    batch: List[str] = []
+    tokens = 0
+    for t in texts:
+        n = _estimate_tokens(t)
+        if batch and (len(batch) >= max_items or tokens + n > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(t)
+        tokens += n
+    if batch:
+        yield batch
+
+
+@timed("embed")
+def embed_texts(texts: Sequence[str], dimensions: Optional[int] = None) -> List[List[float]]:
+    """Embed many texts with as few API requests as possible.
+
+    Output order matches `texts`. Identical (normalized) inputs are embedded once, and
+    cached vectors are reused, so only distinct cache misses are sent to the provider.
+    `dimensions` (default: settings.embedding_dim) shortens text-embedding-3 vectors.
+    """
+    dim = dimensions or settings.embedding_dim
+    norm = [normalize_text(t) for t in texts]
+    embedder = get_embedder()
+    use_cache = settings.embedding_cache_enabled and embedder.cacheable
+    ns = _cache_namespace(dim)
+    vectors: Dict[str, List[float]] = {}
+    missing: List[str] = []
+
+    for t in dict.fromkeys(norm):
+        blob = _get_cache().get(ns, _cache_key(t)) if use_cache else None
+        if blob is not None:
+            vectors[t] = _unpack(blob)
+            embedder.cache_hit(t, dim, vectors[t])
+        else:
+            missing.append(t)
+
+    for batch in _batches(missing):
+        for t, vec in zip(batch, embedder.embed(batch, dim)):
+            vectors[t] = vec
+            if use_cache:
+                _get_cache().set(ns, _cache_key(t), _pack(vec))
+
+    return [vectors[t] for t in norm]
+
+
+def embed_text(text: str, dimensions: Optional[int] = None) -> List[float]:
+    return embed_texts([text], dimensions=dimensions)[0]
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.config import settings
+from src.features.dedup import find_near_duplicate, forget, remember
+from src.features.embedding import embed_texts
+from src.features.preprocess import prepare_file
+from src.features.vision import describe_image, parse_caption_and_tags
+from src.services.qdrant_service import collection_vector_size, confirm_points, existing_ids, upsert_points
+from src.utils.phash import to_hex
+from src.utils.thumbnails import make_thumbnail
+
+_STOP = object()
+
+
+@dataclass
+class IngestItem:
+    """One image travelling through the pipeline.
+
+    `payload` holds the base payload (filename, source, stock, ...); caption, tags and
+    added_at are filled in by the pipeline. Set `raw_caption` up front to skip the VLM.
+    """
+
+    path: Path
+    payload: Dict[str, Any] = field(default_factory=dict)
+    raw_caption: str = ""
+    point_id: Optional[int] = None
+    image_bytes: Optional[bytes] = None
+    image_mime: str = "image/jpeg"
+    phash: Optional[int] = None
+    duplicate_of: str = ""
+    caption: str = ""
+    tags: List[str] = field(default_factory=list)
+    vector: Optional[List[float]] = None
+    stage: str = "queued"
+    error: str = ""
+
+
+class IngestPipeline:
+    """Staged, bounded ingestion: decode/hash -> VLM caption -> batched embed -> batched upsert.
+
+    Every stage is a pool of threads connected by bounded queues, so a slow stage
+    (usually the VLM) applies backpressure upstream instead of buffering the whole
+    input in memory. `on_done` / `on_error` are called from worker threads.
+    """
+
+    def __init__(
+        self,
+        qdrant_client,
+        cpu_workers: Optional[int] = None,
+        vlm_workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        on_done: Optional[Callable[[IngestItem], None]] = None,
+        on_error: Optional[Callable[[IngestItem, Exception], None]] = None,
+        on_skip: Optional[Callable[[IngestItem], None]] = None,
+        skip_existing: bool = False,
+        report: Optional[Callable[[Dict[str, Any]], None]] = None,
+        report_every: float = 5.0,
+        flush_interval: float = 0.5,
+        wait_upserts: bool = True,
+    ) -> None:
+        self.qdrant_client = qdrant_client
+        self.cpu_workers = max(1, cpu_workers or settings.ingest_cpu_workers)
+        self.vlm_workers = max(1, vlm_workers or settings.ingest_vlm_workers)
+        self.batch_size = max(1, batch_size or settings.ingest_batch_size)
+        qsize = max(1, queue_size or settings.ingest_queue_size)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_skip = on_skip
+        # skip_existing: after hashing, drop items whose point id is already in Qdrant, or whose
+        # perceptual hash matches an indexed image (no VLM/embedding cost).
+        self.skip_existing = skip_existing
+        self.report = report
+        self.report_every = report_every
+        self.flush_interval = flush_interval
+        # wait_upserts=False: fire each batch without waiting, confirm all ids once at the end of run().
+        self.wait_upserts = wait_upserts
+        self._upserted_ids: List[int] = []
+
+        self._queues: Dict[str, "queue.Queue[Any]"] = {
+            name: queue.Queue(maxsize=qsize) for name in ("cpu", "check", "vlm", "embed", "upsert")
+        }
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "done": 0, "failed": 0, "skipped": 0}
+        self._started = 0.0
+
+    # --- stats ---------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+        elapsed = max(1e-9, time.time() - self._started) if self._started else 0.0
+        out["elapsed_s"] = round(elapsed, 2)
+        out["images_per_s"] = round(out["done"] / elapsed, 2) if elapsed else 0.0
+        out["queues"] = {name: q.qsize() for name, q in self._queues.items()}
+        return out
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def _fail(self, item: IngestItem, exc: Exception) -> None:
+        item.error = str(exc)[:500]
+        self._count("failed")
+        if item.point_id is not None:
+            forget(item.point_id)  # its phash may have been claimed in the check stage
+        if self.on_error:
+            try:
+                self.on_error(item, exc)
+            except Exception:
+                pass
+
+    # --- stages --------------------------------------------------------------
+
+    def _cpu_stage(self) -> None:
+        q_in = self._queues["cpu"]
+        q_out = self._queues["check" if self.skip_existing else "vlm"]
+        while True:
+            item = q_in.get()
+            if item is _STOP:
+                return
+            try:
+                item.stage = "decode"
+                prepared = prepare_file(item.path)
+                item.image_bytes, item.image_mime = prepared.data, prepared.mime
+                if item.point_id is None:
+                    item.point_id = prepared.content_id
+                item.phash = prepared.phash
+            except Exception as e:
+                self._fail(item, e)
+                continue
+            try:
+                make_thumbnail(prepared.image, item.point_id)
+            except Exception:
+                pass  # the grid generates it lazily later
+            q_out.put(item)
+
+    def _check_stage(self) -> None:
+        q_in, q_out = self._queues["check"], self._queues["vlm"]
+        stopped = False
+        while not stopped:
+            batch, stopped = self._collect(q_in)
+            if not batch:
+                continue
+            try:
+                for item in batch:
+                    item.stage = "check"
+                found = existing_ids(self.qdrant_client, [item.point_id for item in batch])
+            except Exception:
+                found = set()  # existence check is an optimisation only; index everything on failure
+            for item in batch:
+                if str(item.point_id) in found:
+                    item.duplicate_of = str(item.point_id)
+                elif item.phash is not None:
+                    near = find_near_duplicate(self.qdrant_client, item.phash)
+                    if near is not None:
+                        item.duplicate_of = near[0]
+                    else:
+                        # Claim the hash now so near-identical files later in this run are caught too.
+                        remember(self.qdrant_client, item.phash, item.point_id)
+                if not item.duplicate_of:
+                    q_out.put(item)
+                    continue
+                item.stage = "skipped"
+                item.image_bytes = None
+                self._count("skipped")
+                if self.on_skip:
+                    try:
+                        self.on_skip(item)
+                    except Exception:
+                        pass
+
+    def _vlm_stage(self) -> None:
+        q_in, q_out = self._queues["vlm"], self._queues["embed"]
+        while True:
+            item = q_in.get()
+            if item is _STOP:
+                return
+            try:
+                item.stage = "caption"
+                raw = item.raw_caption or describe_image(
+                    item.image_bytes or b"", content_id=item.point_id, mime=item.image_mime
+                )
+                item.caption, parsed_tags = parse_caption_and_tags(raw)
+                if not item.caption:
+                    raise RuntimeError("Empty caption from VLM.")
+                item.tags = sorted(set(item.tags) | set(parsed_tags))
+                item.image_bytes = None  # not needed downstream; keep the in-flight window small
+            except Exception as e:
+                self._fail(item, e)
+                continue
+            q_out.put(item)
+
+    def _collect(self, q_in: "queue.Queue[Any]") -> Tuple[List[IngestItem], bool]:
+        """Block for one item, then gather more until batch_size or flush_interval."""
+        batch: List[IngestItem] = []
+        first = q_in.get()
+        if first is _STOP:
+            return batch, True
+        batch.append(first)
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                nxt = q_in.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                return batch, True
+            batch.append(nxt)
+        return batch, False
+
+    def _embed_stage(self) -> None:
+        q_in, q_out = self._queues["embed"], self._queues["upsert"]
+        stopped = False
+        while not stopped:
+            batch, stopped = self._collect(q_in)
+            if not batch:
+                continue
+            try:
+                for item in batch:
+                    item.stage = "embed"
+                vectors = embed_texts(
+                    [item.caption for item in batch], dimensions=collection_vector_size(self.qdrant_client)
+                )
+            except Exception as e:
+                for item in batch:
+                    self._fail(item, e)
+                continue
+            for item, vec in zip(batch, vectors):
+                item.vector = vec
+                q_out.put(item)
+
+    def _upsert_stage(self) -> None:
+        q_in = self._queues["upsert"]
+        stopped = False
+        while not stopped:
+            batch, stopped = self._collect(q_in)
+            if not batch:
+                continue
+            now = int(time.time())
+            points = []
+            for item in batch:
+                item.stage = "upsert"
+                payload = dict(item.payload)
+                payload.update({"caption": item.caption, "tags": item.tags})
+                if item.phash is not None:
+                    payload["phash"] = to_hex(item.phash)
+                payload.setdefault("added_at", now)
+                points.append((item.point_id, item.vector, payload))
+            try:
+                upsert_points(self.qdrant_client, points, wait=self.wait_upserts, confirm=False)
+            except Exception as e:
+                for item in batch:
+                    self._fail(item, e)
+                continue
+            self._count("done", len(batch))
+            if not self.wait_upserts:
+                self._upserted_ids.extend(item.point_id for item in batch)
+            for item in batch:
+                item.stage = "done"
+                if not self.skip_existing:
+                    remember(self.qdrant_client, item.phash, item.point_id)
+                if self.on_done:
+                    try:
+                        self.on_done(item)
+                    except Exception:
+                        pass
+
+    # --- driver --------------------------------------------------------------
+
+    def _reporter(self, stop: threading.Event) -> None:
+        while not stop.wait(self.report_every):
+            if self.report:
+                self.report(self.stats())
+
+    def run(self, items: Iterable[IngestItem]) -> Dict[str, Any]:
+        """Push all items through the pipeline and block until everything is processed."""
+        self._started = time.time()
+
+        def start(target: Callable[[], None], n: int) -> List[threading.Thread]:
+            threads = [threading.Thread(target=target, daemon=True) for _ in range(n)]
+            for t in threads:
+                t.start()
+            return threads
+
+        stages = [
+            ("cpu", start(self._cpu_stage, self.cpu_workers)),
+            ("check", start(self._check_stage, 1 if self.skip_existing else 0)),
+            ("vlm", start(self._vlm_stage, self.vlm_workers)),
+            ("embed", start(self._embed_stage, 1)),
+            ("upsert", start(self._upsert_stage, 1)),
+        ]
+        stop_report = threading.Event()
+        reporter = threading.Thread(target=self._reporter, args=(stop_report,), daemon=True)
+        reporter.start()
+
+        try:
+            for item in items:
+                self._count("submitted")
+                self._queues["cpu"].put(item)
+        finally:
+            # Drain stage by stage: a stage is stopped only after everything upstream has finished.
+            for name, threads in stages:
+                for _ in threads:
+                    self._queues[name].put(_STOP)
+                for t in threads:
+                    t.join()
+            stop_report.set()
+            reporter.join()
+
+        if self._upserted_ids:
+            confirm_points(self.qdrant_client, self._upserted_ids)
+
+        final = self.stats()
+        if self.report:
+            self.report(final)
+        return final
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    q = stats.get("queues") or {}
+    depths = " ".join(f"{k}={v}" for k, v in q.items())
+    return (
+        f"done {stats.get('done', 0)}/{stats.get('submitted', 0)} "
+        f"skipped {stats.get('skipped', 0)} failed {stats.get('failed', 0)} | {stats.get('images_per_s', 0.0)} img/s "
+        f"| {stats.get('elapsed_s', 0.0)}s | queues: {depths}"
+    )
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config import settings
+
+
+@dataclass
+class Job:
+    """Status record of one background job (what the UI polls)."""
+
+    id: str
+    kind: str
+    label: str = ""
+    status: str = "queued"  # queued -> running -> done | failed
+    stage: str = ""
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+    created_ts: float = field(default_factory=time.time)
+    started_ts: float = 0.0
+    finished_ts: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"done", "failed"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobRunner:
+    """Thread pool for work that must outlive a Streamlit script run.
+
+    The job function gets its Job as first argument and may update `job.stage` /
+    `job.result`; its return value (a dict) is merged into `job.result`. Finished jobs
+    are kept (bounded by `keep`) so pages can still show their outcome after a rerun.
+    """
+
+    def __init__(self, workers: Optional[int] = None, keep: int = 500) -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers or settings.job_workers), thread_name_prefix="job"
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable[..., Optional[Dict[str, Any]]],
+        *args: Any,
+        label: str = "",
+        **kwargs: Any,
+    ) -> str:
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind, label=label)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        job.status, job.started_ts = "running", time.time()
+        try:
+            out = fn(job, *args, **kwargs)
+            if isinstance(out, dict):
+                job.result.update(out)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)[:500]
+            job.status = "failed"
+        finally:
+            job.finished_ts = time.time()
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished]
+        for j in sorted(finished, key=lambda j: j.finished_ts)[: max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[j.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, ids: Optional[List[str]] = None, kind: Optional[str] = None) -> List[Job]:
+        """Jobs by id (in that order) or all of `kind`, newest first."""
+        if ids is not None:
+            return [j for j in (self._jobs.get(i) for i in ids) if j is not None]
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if kind is not None:
+            jobs = [j for j in jobs if j.kind == kind]
+        return sorted(jobs, key=lambda j: j.created_ts, reverse=True)
+
+    def active_count(self) -> int:
+        return sum(1 for j in list(self._jobs.values()) if not j.finished)
+
+
+_runner: Optional[JobRunner] = None
+_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Process-wide runner shared by every session."""
+    global _runner
+    if _runner is None:
+        with _lock:
+            if _runner is None:
+                _runner = JobRunner()
+    return _runner
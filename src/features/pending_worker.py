@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config import settings
+from src.features.dedup import remember
+from src.features.embedding import embed_texts
+from src.features.preprocess import prepare_file
+from src.features.vision import describe_image, parse_caption_and_tags
+from src.services.qdrant_service import collection_vector_size, is_local, upsert_points
+from src.utils.history import append_history
+from src.utils.pending import claim_due, mark_failed, remove_pending
+from src.utils.phash import from_hex, to_hex
+
+
+def caption_pending_item(item: Dict[str, Any]) -> None:
+    """Fill in caption/tags (and phash) of a pending item queued without a caption (VLM outage)."""
+    prepared = prepare_file(Path(item["filename"]))
+    raw = describe_image(prepared.data, content_id=prepared.content_id, mime=prepared.mime)
+    caption, parsed_tags = parse_caption_and_tags(raw)
+    if not caption:
+        raise RuntimeError("Empty caption from VLM.")
+    item["caption"] = caption
+    item["tags"] = sorted(set(item.get("tags") or []) | set(parsed_tags))
+    item["phash"] = item.get("phash") or to_hex(prepared.phash)
+
+
+class PendingWorker:
+    """Background thread that drains the pending-upload queue (src/utils/pending).
+
+    Due jobs are leased in batches; jobs queued without a caption are captioned first,
+    then each batch is embedded with one request and
+    upserted with one bulk call. Up to `workers` batches run at once. Failed jobs are
+    rescheduled with exponential backoff, so after an outage the backlog clears itself
+    without hammering the API while it is still down.
+    """
+
+    def __init__(
+        self,
+        qdrant_client,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_s: Optional[float] = None,
+    ) -> None:
+        self.qdrant_client = qdrant_client
+        self.workers = max(1, workers or settings.pending_workers)
+        if is_local(qdrant_client):
+            self.workers = 1  # embedded Qdrant is not safe for concurrent writes
+        self.batch_size = max(1, batch_size or settings.pending_batch_size)
+        self.poll_s = poll_s if poll_s is not None else settings.pending_poll_s
+        self.indexed = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "PendingWorker":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="pending-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        """Check the queue now instead of at the next poll (e.g. after "Retry all")."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pending") as pool:
+            while not self._stop.is_set():
+                futures = []
+                try:
+                    for _ in range(self.workers):
+                        batch = claim_due(self.batch_size)
+                        if not batch:
+                            break
+                        futures.append(pool.submit(self.process, batch))
+                except Exception:
+                    pass  # queue DB busy/locked: try again next round
+                for fut in futures:
+                    try:
+                        fut.result()
+                    except Exception:
+                        pass  # leases expire, so the jobs come back on their own
+                if not futures:
+                    self._wake.wait(self.poll_s)
+                    self._wake.clear()
+
+    def process(self, batch: List[Dict[str, Any]]) -> None:
+        ready: List[Dict[str, Any]] = []
+        for item in batch:
+            if not Path(str(item.get("filename") or "")).is_file():
+                mark_failed([str(item["id"])], "File not found on disk.")
+                self.failed += 1
+                continue
+            if not item.get("caption"):
+                try:
+                    caption_pending_item(item)
+                except Exception as e:
+                    mark_failed([str(item["id"])], f"[caption] {e}")
+                    self.failed += 1
+                    continue
+            ready.append(item)
+        if not ready:
+            return
+
+        ids = [str(item["id"]) for item in ready]
+        try:
+            vectors = embed_texts(
+                [item["caption"] for item in ready], dimensions=collection_vector_size(self.qdrant_client)
+            )
+            now = int(time.time())
+            points = []
+            for item, vec in zip(ready, vectors):
+                payload = {
+                    "filename": item["filename"],
+                    "caption": item["caption"],
+                    "tags": item.get("tags") or [],
+                    "stock": False,
+                    "source": "pending_retry",
+                    "added_at": now,
+                }
+                if item.get("phash"):
+                    payload["phash"] = item["phash"]
+                pid = int(item["id"]) if str(item["id"]).isdigit() else item["id"]
+                points.append((pid, vec, payload))
+            upsert_points(self.qdrant_client, points)
+        except Exception as e:
+            mark_failed(ids, str(e))
+            self.failed += len(ids)
+            return
+
+        for item in ready:
+            remember(self.qdrant_client, from_hex(item.get("phash")), item["id"])
+        remove_pending(ids)
+        self.indexed += len(ids)
+        append_history({"mode": "pending_retry", "status": "indexed", "count": len(ids), "ids": ids[:50]})
+
+
+_worker: Optional[PendingWorker] = None
+_lock = threading.Lock()
+
+
+def start_pending_worker(qdrant_client) -> PendingWorker:
+    """Process-wide worker; started once (the app calls this from a st.cache_resource)."""
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = PendingWorker(qdrant_client).start()
+    return _worker
+
+
+def get_pending_worker() -> Optional[PendingWorker]:
+    return _worker
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from src.config import settings
+from src.utils.ids import stable_id_from_bytes
+from src.utils.phash import dhash
+from src.utils.timing import timed
+
+
+@dataclass
+class PreparedImage:
+    """An image ready for indexing/search.
+
+    `content_id` is derived from the original file bytes, so it does not depend on how we
+    re-encode for the VLM. `data`/`mime` is the compact upload for the VLM, `image`
+    is the downscaled RGB image (reused for thumbnails) and `phash` its perceptual hash.
+    """
+
+    content_id: int
+    data: bytes
+    mime: str
+    image: Image.Image
+    phash: int
+
+
+def content_id(raw: bytes) -> int:
+    return stable_id_from_bytes(raw)
+
+
+def decode_downscaled(raw: bytes, max_side: Optional[int] = None) -> Image.Image:
+    """Decode at reduced size: JPEG draft mode lets libjpeg scale by 1/2..1/8 while decoding."""
+    max_side = max_side or settings.vlm_max_side
+    img = Image.open(BytesIO(raw))
+    if img.format == "JPEG":
+        img.draft("RGB", (max_side, max_side))
+    img = img.convert("RGB")
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return img
+
+
+def encode_for_vlm(img: Image.Image, fmt: Optional[str] = None, quality: Optional[int] = None) -> Tuple[bytes, str]:
+    fmt = (fmt or settings.vlm_image_format).upper()
+    quality = quality or settings.vlm_image_quality
+    bio = BytesIO()
+    if fmt == "PNG":
+        img.save(bio, format="PNG")
+        return bio.getvalue(), "image/png"
+    if fmt == "WEBP":
+        img.save(bio, format="WEBP", quality=quality, method=4)
+        return bio.getvalue(), "image/webp"
+    img.save(bio, format="JPEG", quality=quality)
+    return bio.getvalue(), "image/jpeg"
+
+
+@timed("preprocess")
+def prepare_image(raw: bytes, max_side: Optional[int] = None) -> PreparedImage:
+    img = decode_downscaled(raw, max_side)
+    data, mime = encode_for_vlm(img)
+    return PreparedImage(content_id=content_id(raw), data=data, mime=mime, image=img, phash=dhash(img))
+
+
+@timed("preprocess")
+def prepare_file(path: Path, max_side: Optional[int] = None) -> PreparedImage:
+    return prepare_image(Path(path).read_bytes(), max_side)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.services.providers import get_embedder
+from src.utils.versions import get_version
+
+# (query label, results) as shown by the Search tab
+SearchResult = Tuple[str, List[Any]]
+
+
+class TTLCache:
+    """Thread-safe in-process LRU with a per-entry time-to-live."""
+
+    def __init__(self, max_items: int, ttl_s: float) -> None:
+        self.max_items = max(1, int(max_items))
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl_s:
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "items": len(self._items)}
+
+
+_cache = TTLCache(settings.search_cache_max_items, settings.search_cache_ttl_s)
+
+
+def _key(query_key: str, source_choice: str, top_k: int, version: int) -> str:
+    # The data version is part of the key: any write to Qdrant makes every older entry unreachable.
+    parts = [query_key, source_choice, int(top_k), settings.qdrant_collection, get_embedder().cache_tag, version]
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def cached_search(
+    query_key: str,
+    source_choice: str,
+    top_k: int,
+    compute: Callable[[], SearchResult],
+) -> Tuple[SearchResult, bool]:
+    """Return (compute() or its cached value, hit).
+
+    `query_key` identifies the query without embedding it (normalized text, or the content
+    id of a query image), so a hit skips captioning, embedding and the vector search.
+    """
+    version = get_version()  # read before computing: a concurrent write then simply misses next time
+    # While recording (PROVIDER_RECORD), a hit would skip the embedding the replay needs.
+    if not settings.search_cache_enabled or settings.provider_record or version < 0:
+        return compute(), False
+    key = _key(query_key, source_choice, top_k, version)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit, True
+    value = compute()
+    _cache.set(key, value)
+    return value, False
+
+
+def search_cache_stats() -> Dict[str, int]:
+    return _cache.stats()
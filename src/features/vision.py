@@ -2,12 +2,29 @@ from __future__ import annotations
 
 import base64
 from io import BytesIO
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from PIL import Image
 
-from src.services.openai_client import get_openai_client
 from src.config import settings
+from src.services.providers import get_captioner
+from src.utils.ids import stable_id_from_bytes
+from src.utils.kv_cache import CACHE_DIR, SqliteLRUCache
+from src.utils.timing import timed
+
+# Bump PROMPT_VERSION whenever the prompts below change: cached captions are keyed by it.
+PROMPT_VERSION = "v1"
+SYSTEM_PROMPT = "You describe images for search indexing."
+USER_PROMPT = "Describe this image in 1-2 sentences. Then on a new line write: Tags: tag1, tag2, tag3, tag4, tag5"
+
+_caption_cache: Optional[SqliteLRUCache] = None
+
+
+def _get_caption_cache() -> SqliteLRUCache:
+    global _caption_cache
+    if _caption_cache is None:
+        _caption_cache = SqliteLRUCache(CACHE_DIR / "captions.sqlite", max_items=settings.caption_cache_max_items)
+    return _caption_cache
 
 
 def pil_to_png_bytes(img: Image.Image, max_side: int = 1024) -> bytes:
@@ -65,22 +82,38 @@ def parse_caption_and_tags(raw: str) -> Tuple[str, List[str]]:
     return caption.strip(), tags
 
 
-def describe_image(image_bytes: bytes) -> str:
-    """Use VLM to describe image (for indexing/search)."""
-    client = get_openai_client()
-    data_url = image_bytes_to_data_url(image_bytes)
-
-    resp = client.chat.completions.create(
-        model=settings.vlm_model,
-        messages=[
-            {"role": "system", "content": "You describe images for search indexing."},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Describe this image in 1-2 sentences. Then on a new line write: Tags: tag1, tag2, tag3, tag4, tag5"},
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                ],
-            },
-        ],
-    )
-    return (resp.choices[0].message.content or "").strip()
+def caption_cache_stats() -> Dict[str, int]:
+    return _get_caption_cache().stats()
+
+
+def caption_namespace() -> str:
+    """Identifies what a caption depends on besides the pixels (provider/model, prompt version)."""
+    return f"{get_captioner().cache_tag}:{PROMPT_VERSION}"
+
+
+@timed("describe")
+def describe_image(image_bytes: bytes, content_id: Optional[int] = None, mime: str = "image/png") -> str:
+    """Use VLM to describe image (for indexing/search).
+
+    Raw captions are cached on disk by content id (see `stable_id_from_bytes`), captioning
+    provider/model and prompt version, so the same pixels are never described twice. Pass
+    `content_id` when the caller already computed it.
+    """
+    captioner = get_captioner()
+    use_cache = settings.caption_cache_enabled and captioner.cacheable
+    cache_ns = caption_namespace()
+    if content_id is None:
+        content_id = stable_id_from_bytes(image_bytes)
+    cache_key = str(content_id)
+    if use_cache:
+        cached = _get_caption_cache().get(cache_ns, cache_key)
+        if cached is not None:
+            raw = cached.decode("utf-8")
+            captioner.cache_hit(content_id, raw)
+            return raw
+
+    raw = captioner.describe(image_bytes, mime, content_id, SYSTEM_PROMPT, USER_PROMPT)
+    # Don't cache empty answers: they are almost always transient refusals/errors.
+    if raw and use_cache:
+        _get_caption_cache().set(cache_ns, cache_key, raw.encode("utf-8"))
+    return raw
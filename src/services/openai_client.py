@@ -1,10 +1,70 @@
 from __future__ import annotations
 
-from openai import OpenAI
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from src.config import settings
 
+# One client per process: OpenAI/httpx clients are thread-safe and keep a pool of
+# keep-alive connections, so every Streamlit session and worker thread shares it.
+_client: Optional[OpenAI] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
 
-def get_openai_client() -> OpenAI:
+
+def _check_key() -> None:
     if not settings.openai_api_key:
         raise RuntimeError("Missing OPENAI_API_KEY in environment (.env).")
-    return OpenAI(api_key=settings.openai_api_key)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.openai_read_timeout, connect=settings.openai_connect_timeout)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_keepalive,
+        keepalive_expiry=60.0,
+    )
+
+
+def get_openai_client() -> OpenAI:
+    global _client
+    _check_key()
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=settings.openai_api_key,
+                    timeout=_timeout(),
+                    max_retries=settings.openai_max_retries,
+                    http_client=httpx.Client(timeout=_timeout(), limits=_limits()),
+                )
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Async sibling of `get_openai_client` for asyncio pipelines.
+
+    httpx async pools are bound to the event loop that created them, so there is one
+    client per running loop (dropped automatically when the loop is garbage-collected).
+    Must be called from inside a running loop.
+    """
+    _check_key()
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                timeout=_timeout(),
+                max_retries=settings.openai_max_retries,
+                http_client=httpx.AsyncClient(timeout=_timeout(), limits=_limits()),
+            )
+            _async_clients[loop] = client
+    return client
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import base64
+import colorsys
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from src.config import settings
+from src.services.openai_client import get_openai_client
+from src.utils.bm25 import tokenize
+
+
+class EmbeddingProvider:
+    """Turns texts into vectors. Selected with EMBEDDING_PROVIDER (see get_embedder).
+
+    `cache_tag` names the vector space: it is part of every cache key, so vectors of
+    different providers/models never mix. `cacheable=False` skips the embedding cache
+    (for backends that are cheaper than a cache lookup).
+    """
+
+    name = ""
+    cacheable = True
+
+    @property
+    def cache_tag(self) -> str:
+        return self.name
+
+    def supports_dimensions(self) -> bool:
+        return False
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        raise NotImplementedError
+
+    def cache_hit(self, text: str, dimensions: int, vector: List[float]) -> None:
+        """Called for texts served from the embedding cache (embed() never sees them)."""
+
+
+class CaptionProvider:
+    """Describes an image as "caption\\nTags: ...". Selected with CAPTION_PROVIDER (see get_captioner)."""
+
+    name = ""
+    cacheable = True
+
+    @property
+    def cache_tag(self) -> str:
+        return self.name
+
+    def describe(self, image_bytes: bytes, mime: str, content_id: int, system_prompt: str, user_prompt: str) -> str:
+        raise NotImplementedError
+
+    def cache_hit(self, content_id: int, raw: str) -> None:
+        """Called for images whose caption came from the caption cache (describe() never sees them)."""
+
+
+# --- OpenAI --------------------------------------------------------------------------
+
+
+class OpenAIEmbedder(EmbeddingProvider):
+    name = "openai"
+
+    @property
+    def cache_tag(self) -> str:
+        # Just the model name: keeps embeddings cached before providers existed valid.
+        return settings.embedding_model
+
+    def supports_dimensions(self) -> bool:
+        # text-embedding-3-* can return shortened vectors; older models (ada-002) reject the parameter.
+        return settings.embedding_model.startswith("text-embedding-3")
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        extra = {"dimensions": dimensions} if self.supports_dimensions() else {}
+        resp = get_openai_client().embeddings.create(model=settings.embedding_model, input=texts, **extra)
+        out: List[List[float]] = [[] for _ in texts]
+        for item in resp.data:
+            out[item.index] = item.embedding
+        return out
+
+
+class OpenAICaptioner(CaptionProvider):
+    name = "openai"
+
+    @property
+    def cache_tag(self) -> str:
+        return settings.vlm_model
+
+    def describe(self, image_bytes: bytes, mime: str, content_id: int, system_prompt: str, user_prompt: str) -> str:
+        data_url = f"data:{mime};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+        resp = get_openai_client().chat.completions.create(
+            model=settings.vlm_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": user_prompt},
+                        {"type": "image_url", "image_url": {"url": data_url}},
+                    ],
+                },
+            ],
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+
+# --- local, deterministic (no network) ---------------------------------------------------
+
+
+def _inject_faults() -> None:
+    """Simulated provider latency and failures (LOCAL_LATENCY_MS, LOCAL_ERROR_RATE) for load tests."""
+    if settings.local_latency_ms > 0:
+        time.sleep(settings.local_latency_ms / 1000.0)
+    if settings.local_error_rate > 0 and random.random() < settings.local_error_rate:
+        raise RuntimeError("Injected local provider error.")
+
+
+class HashingEmbedder(EmbeddingProvider):
+    """Feature-hashing bag of words and word bigrams, L2-normalised, at any dimension.
+
+    Same text -> same vector on every machine; texts sharing words are close in cosine
+    space, so search behaves sensibly (lexically) for load tests and benchmarks.
+    """
+
+    name = "local"
+    cacheable = False
+
+    @property
+    def cache_tag(self) -> str:
+        return "local-hash-v1"
+
+    def supports_dimensions(self) -> bool:
+        return True
+
+    def _vector(self, text: str, dim: int) -> List[float]:
+        tokens = tokenize(text) or ["<empty>"]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vec = [0.0] * dim
+        for feature in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % dim] += 1.0 if (h >> 63) else -1.0  # signed hashing keeps collisions unbiased
+        norm = math.sqrt(sum(v * v for v in vec))
+        if not norm:
+            vec[0], norm = 1.0, 1.0  # features cancelled out; cosine needs a non-zero vector
+        return [v / norm for v in vec]
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        _inject_faults()
+        return [self._vector(t, dimensions) for t in texts]
+
+
+_PALETTE = {
+    "black": (20, 20, 20),
+    "white": (235, 235, 235),
+    "gray": (128, 128, 128),
+    "red": (200, 40, 40),
+    "orange": (230, 140, 40),
+    "yellow": (230, 210, 60),
+    "green": (60, 160, 70),
+    "blue": (50, 100, 200),
+    "purple": (130, 70, 170),
+    "pink": (230, 140, 180),
+    "brown": (120, 80, 50),
+}
+
+
+def _color_name(rgb) -> str:
+    return min(_PALETTE, key=lambda n: sum((a - b) ** 2 for a, b in zip(rgb, _PALETTE[n])))
+
+
+class FakeCaptioner(CaptionProvider):
+    """Rule-based caption from pixel statistics (dominant colours, brightness, orientation).
+
+    Deterministic for the same image bytes and in the same "caption\\nTags: ..." format as
+    the VLM, so parse_caption_and_tags and the rest of the pipeline run unchanged.
+    """
+
+    name = "local"
+    cacheable = False
+
+    @property
+    def cache_tag(self) -> str:
+        return "local-rules-v1"
+
+    def describe(self, image_bytes: bytes, mime: str, content_id: int, system_prompt: str, user_prompt: str) -> str:
+        _inject_faults()
+        try:
+            img = Image.open(BytesIO(image_bytes))
+            w, h = img.size
+            small = img.convert("RGB").resize((32, 32))
+        except Exception:
+            return "An image.\nTags: image"
+        pixels = list(small.getdata())
+        colors = [c for c, _ in Counter(_color_name(p) for p in pixels).most_common(2)]
+        lum = sum(0.299 * r + 0.587 * g + 0.114 * b for r, g, b in pixels) / len(pixels) / 255
+        sat = sum(colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)[1] for r, g, b in pixels) / len(pixels)
+        brightness = "dark" if lum < 0.35 else "bright" if lum > 0.65 else "evenly lit"
+        tone = "colorful" if sat > 0.35 else "muted"
+        shape = "landscape" if w > h * 1.1 else "portrait" if h > w * 1.1 else "square"
+        article = "An" if brightness[0] in "aeiou" else "A"
+        caption = f"{article} {brightness}, {tone} {shape} image dominated by {' and '.join(colors)} tones."
+        return caption + "\nTags: " + ", ".join([*colors, brightness, tone, shape])
+
+
+# --- replay / recording -------------------------------------------------------------------
+
+
+class ReplayStore:
+    """Append-only JSONL of recorded responses: {"key": ..., "value": ...} per line."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._items: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        if self._items is None:
+            items: Dict[str, Any] = {}
+            if self.path.exists():
+                for line in self.path.read_text(encoding="utf-8").splitlines():
+                    try:
+                        rec = json.loads(line)
+                        items[rec["key"]] = rec["value"]
+                    except Exception:
+                        continue  # torn last line of an interrupted recording
+            self._items = items
+        return self._items
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            items = self._load()
+            if key in items and items[key] == value:
+                return  # e.g. the same cache hit recorded again
+            items[key] = value
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n")
+
+
+def _embedding_key(text: str, dim: int) -> str:
+    return f"{dim}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+class ReplayEmbedder(EmbeddingProvider):
+    """Serves vectors recorded with PROVIDER_RECORD=1; unknown texts raise LookupError."""
+
+    name = "replay"
+
+    def __init__(self, store: ReplayStore) -> None:
+        self.store = store
+
+    @property
+    def cache_tag(self) -> str:
+        return f"replay:{settings.embedding_model}"
+
+    def supports_dimensions(self) -> bool:
+        return True  # whatever was recorded
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        out = []
+        for t in texts:
+            vec = self.store.get(_embedding_key(t, dimensions))
+            if vec is None:
+                raise LookupError(f"No recorded embedding ({dimensions} dims) for: {t[:80]!r}")
+            out.append(vec)
+        return out
+
+
+class ReplayCaptioner(CaptionProvider):
+    """Serves captions recorded with PROVIDER_RECORD=1 (keyed by image content id)."""
+
+    name = "replay"
+
+    def __init__(self, store: ReplayStore) -> None:
+        self.store = store
+
+    @property
+    def cache_tag(self) -> str:
+        return f"replay:{settings.vlm_model}"
+
+    def describe(self, image_bytes: bytes, mime: str, content_id: int, system_prompt: str, user_prompt: str) -> str:
+        raw = self.store.get(str(content_id))
+        if raw is None:
+            raise LookupError(f"No recorded caption for image {content_id}.")
+        return raw
+
+
+class RecordingEmbedder(EmbeddingProvider):
+    """Wraps a live embedder and writes every response, cached or not, to the replay store."""
+
+    def __init__(self, inner: EmbeddingProvider, store: ReplayStore) -> None:
+        self.inner, self.store = inner, store
+        self.name, self.cacheable = inner.name, inner.cacheable
+
+    @property
+    def cache_tag(self) -> str:
+        return self.inner.cache_tag
+
+    def supports_dimensions(self) -> bool:
+        return self.inner.supports_dimensions()
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        vectors = self.inner.embed(texts, dimensions)
+        for t, vec in zip(texts, vectors):
+            self.store.put(_embedding_key(t, dimensions), vec)
+        return vectors
+
+    def cache_hit(self, text: str, dimensions: int, vector: List[float]) -> None:
+        self.store.put(_embedding_key(text, dimensions), vector)
+
+
+class RecordingCaptioner(CaptionProvider):
+    def __init__(self, inner: CaptionProvider, store: ReplayStore) -> None:
+        self.inner, self.store = inner, store
+        self.name, self.cacheable = inner.name, inner.cacheable
+
+    @property
+    def cache_tag(self) -> str:
+        return self.inner.cache_tag
+
+    def describe(self, image_bytes: bytes, mime: str, content_id: int, system_prompt: str, user_prompt: str) -> str:
+        raw = self.inner.describe(image_bytes, mime, content_id, system_prompt, user_prompt)
+        if raw:
+            self.store.put(str(content_id), raw)
+        return raw
+
+    def cache_hit(self, content_id: int, raw: str) -> None:
+        self.store.put(str(content_id), raw)
+
+
+# --- selection ----------------------------------------------------------------------------
+
+_embedder: Optional[EmbeddingProvider] = None
+_captioner: Optional[CaptionProvider] = None
+_lock = threading.Lock()
+
+
+def _replay_store(kind: str) -> ReplayStore:
+    return ReplayStore(Path(settings.replay_dir) / f"{kind}.jsonl")
+
+
+def get_embedder() -> EmbeddingProvider:
+    """Process-wide embedder for EMBEDDING_PROVIDER = openai | local | replay."""
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                kind = settings.embedding_provider
+                embedder: EmbeddingProvider
+                if kind == "local":
+                    embedder = HashingEmbedder()
+                elif kind == "replay":
+                    embedder = ReplayEmbedder(_replay_store("embeddings"))
+                elif kind == "openai":
+                    embedder = OpenAIEmbedder()
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {kind!r} (openai | local | replay)")
+                if settings.provider_record and kind != "replay":
+                    embedder = RecordingEmbedder(embedder, _replay_store("embeddings"))
+                # Published only once fully built: the unlocked check above must never see the bare provider.
+                _embedder = embedder
+    return _embedder
+
+
+def get_captioner() -> CaptionProvider:
+    """Process-wide captioner for CAPTION_PROVIDER = openai | local | replay."""
+    global _captioner
+    if _captioner is None:
+        with _lock:
+            if _captioner is None:
+                kind = settings.caption_provider
+                captioner: CaptionProvider
+                if kind == "local":
+                    captioner = FakeCaptioner()
+                elif kind == "replay":
+                    captioner = ReplayCaptioner(_replay_store("captions"))
+                elif kind == "openai":
+                    captioner = OpenAICaptioner()
+                else:
+                    raise ValueError(f"Unknown CAPTION_PROVIDER: {kind!r} (openai | local | replay)")
+                if settings.provider_record and kind != "replay":
+                    captioner = RecordingCaptioner(captioner, _replay_store("captions"))
+                _captioner = captioner
+    return _captioner
@@ -1,19 +1,56 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import json
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import UnexpectedResponse
 from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    Direction,
     Distance,
     Filter,
     FieldCondition,
+    Fusion,
+    FusionQuery,
+    HasIdCondition,
+    HnswConfigDiff,
     MatchValue,
+    Modifier,
+    OptimizersConfigDiff,
+    OrderBy,
+    PayloadSchemaType,
+    PointIdsList,
     PointStruct,
     PointsSelector,
+    Prefetch,
+    Range,
+    QueryRequest,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SetPayload,
+    SetPayloadOperation,
+    SparseVector,
+    SparseVectorParams,
     VectorParams,
 )
 
 from src.config import settings
+from src.utils.bm25 import document_text, document_vector, query_vector, tokenize
+from src.utils.timing import timed
+from src.utils.versions import QDRANT_DELETES, bump_version, get_version
 
 
 def get_qdrant_client() -> QdrantClient:
@@ -40,30 +77,366 @@ def get_qdrant_client() -> QdrantClient:
     return QdrantClient(path="qdrant_local", timeout=60)
 
 
-def ensure_collection_exists(client: QdrantClient) -> None:
-    """Create collection if missing."""
+# Payload fields we filter/order on. Reconciled at startup by ensure_collection_exists.
+PAYLOAD_SCHEMA: Dict[str, PayloadSchemaType] = {
+    "stock": PayloadSchemaType.BOOL,
+    "source": PayloadSchemaType.KEYWORD,
+    "tags": PayloadSchemaType.KEYWORD,
+    "added_at": PayloadSchemaType.INTEGER,
+}
+
+
+def is_local(client: QdrantClient) -> bool:
+    """Embedded (file/in-memory) Qdrant: ignores indexes/tuning and is not safe for concurrent writes."""
+    return type(getattr(client, "_client", None)).__name__ == "QdrantLocal"
+
+
+# Upload jobs, the bulk pipeline and the pending worker write from different threads;
+# embedded Qdrant gets them one at a time (a server handles concurrent writes itself).
+_local_write_lock = threading.RLock()
+
+
+def _write_lock(client: QdrantClient):
+    return _local_write_lock if is_local(client) else nullcontext()
+
+
+def resolve_alias(client: QdrantClient, name: Optional[str] = None) -> str:
+    """Physical collection behind `name` (`name` itself when it is not an alias)."""
+    name = name or settings.qdrant_collection
     try:
-        exists = client.collection_exists(settings.qdrant_collection)
+        for alias in client.get_aliases().aliases:
+            if alias.alias_name == name:
+                return alias.collection_name
+    except Exception:
+        pass
+    return name
+
+
+def switch_alias(client: QdrantClient, alias: str, collection_name: str) -> None:
+    """Point `alias` at `collection_name` in a single atomic request (readers never see a gap)."""
+    ops: List[Any] = []
+    if resolve_alias(client, alias) != alias:
+        ops.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    ops.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+    with _write_lock(client):
+        client.update_collection_aliases(change_aliases_operations=ops)
+    _vector_sizes.clear()
+    bump_version()
+    bump_version(QDRANT_DELETES)
+
+
+# collection name -> (checked_at, deletes version, (dense size, has sparse vector)). An alias
+# switch in any process bumps QDRANT_DELETES, which drops the entry at once; the short TTL
+# covers aliases moved by other tools.
+_vector_sizes: Dict[str, Tuple[float, int, Tuple[int, bool]]] = {}
+VECTOR_SIZE_TTL_S = 30.0
+
+# Named sparse (BM25) vector next to the unnamed dense one; see src/utils/bm25.py.
+SPARSE_VECTOR = "text"
+
+
+def _collection_shape(client: QdrantClient, collection_name: Optional[str] = None) -> Tuple[int, bool]:
+    name = collection_name or settings.qdrant_collection
+    version = get_version(QDRANT_DELETES)
+    cached = _vector_sizes.get(name)
+    if cached and time.time() - cached[0] < VECTOR_SIZE_TTL_S and cached[1] == version:
+        return cached[2]
+    try:
+        params = client.get_collection(name).config.params
+        vectors = params.vectors
+        if isinstance(vectors, dict):
+            vectors = vectors.get("") or next(iter(vectors.values()))
+        shape = (int(vectors.size), SPARSE_VECTOR in (params.sparse_vectors or {}))
+    except Exception:
+        # no collection yet: it will be created with this size (and the sparse vector)
+        return settings.embedding_dim, True
+    _vector_sizes[name] = (time.time(), version, shape)
+    return shape
+
+
+def collection_vector_size(client: QdrantClient, collection_name: Optional[str] = None) -> int:
+    """Dense vector size of the collection (or alias target); queries must be embedded at this size."""
+    return _collection_shape(client, collection_name)[0]
+
+
+def has_sparse_vector(client: QdrantClient, collection_name: Optional[str] = None) -> bool:
+    """Whether points carry the BM25 sparse vector (collections created before it need a migration)."""
+    return _collection_shape(client, collection_name)[1]
+
+
+def _hnsw_config() -> HnswConfigDiff:
+    return HnswConfigDiff(
+        m=settings.hnsw_m,
+        ef_construct=settings.hnsw_ef_construct,
+        full_scan_threshold=settings.hnsw_full_scan_threshold,
+    )
+
+
+def _optimizers_config() -> OptimizersConfigDiff:
+    return OptimizersConfigDiff(
+        indexing_threshold=settings.optimizer_indexing_threshold,
+        default_segment_number=settings.optimizer_default_segment_number or None,
+    )
+
+
+def _quantization_config(kind: Optional[str] = None):
+    """Quantized copy of the vectors (kept in RAM); originals can then live on disk."""
+    kind = (kind if kind is not None else settings.quantization).lower()
+    if kind == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=0.99, always_ram=settings.quantization_always_ram
+            )
+        )
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=settings.quantization_always_ram))
+    return None
+
+
+def _search_params(
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    rescore: Optional[bool] = None,
+    oversampling: Optional[float] = None,
+) -> SearchParams:
+    """Query-time params: HNSW ef + quantization oversampling/rescoring (ignored without quantization)."""
+    return SearchParams(
+        hnsw_ef=hnsw_ef or settings.search_hnsw_ef or None,
+        exact=exact,
+        quantization=QuantizationSearchParams(
+            rescore=settings.search_rescore if rescore is None else rescore,
+            oversampling=oversampling or settings.search_oversampling,
+        ),
+    )
+
+
+def ensure_collection_exists(
+    client: QdrantClient,
+    collection_name: Optional[str] = None,
+    vector_size: Optional[int] = None,
+    quantization: Optional[str] = None,
+) -> None:
+    """Create collection if missing, then reconcile payload indexes, HNSW/optimizer and quantization params.
+
+    An alias is resolved first, so settings apply to the collection it currently points at.
+    """
+    name = resolve_alias(client, collection_name)
+    try:
+        exists = client.collection_exists(name)
     except Exception:
         # older clients: try get_collection
         try:
-            client.get_collection(settings.qdrant_collection)
+            client.get_collection(name)
             exists = True
         except Exception:
             exists = False
 
-    if exists:
-        return
+    if not exists:
+        with _write_lock(client):
+            client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(
+                    size=vector_size or settings.embedding_dim,
+                    distance=Distance.COSINE,
+                    on_disk=settings.vectors_on_disk or None,
+                ),
+                sparse_vectors_config={SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)},
+                hnsw_config=_hnsw_config(),
+                optimizers_config=_optimizers_config(),
+                quantization_config=_quantization_config(quantization),
+            )
 
-    client.create_collection(
-        collection_name=settings.qdrant_collection,
-        vectors_config=VectorParams(size=settings.embedding_dim, distance=Distance.COSINE),
+    if is_local(client):
+        return  # local mode ignores payload indexes and tuning (and warns on every call)
+    try:
+        _reconcile_collection(client, name, quantization)
+    except Exception:
+        # Best-effort: never block the app on schema tuning (e.g. old servers, read-only API keys).
+        pass
+
+
+def _reconcile_collection(client: QdrantClient, name: str, quantization: Optional[str] = None) -> None:
+    info = client.get_collection(name)
+
+    existing = info.payload_schema or {}
+    for field, schema in PAYLOAD_SCHEMA.items():
+        if field not in existing:
+            client.create_payload_index(
+                collection_name=name,
+                field_name=field,
+                field_schema=schema,
+            )
+
+    want_hnsw, want_opt = _hnsw_config(), _optimizers_config()
+    hnsw_changed = any(
+        getattr(info.config.hnsw_config, k, None) != v
+        for k, v in want_hnsw.model_dump(exclude_none=True).items()
     )
+    opt_changed = any(
+        getattr(info.config.optimizer_config, k, None) != v
+        for k, v in want_opt.model_dump(exclude_none=True).items()
+    )
+    # Only switch quantization on when configured; never silently drop an existing one.
+    want_quant = _quantization_config(quantization)
+    quant_changed = want_quant is not None and type(info.config.quantization_config) is not type(want_quant)
+    if hnsw_changed or opt_changed or quant_changed:
+        client.update_collection(
+            collection_name=name,
+            hnsw_config=want_hnsw if hnsw_changed else None,
+            optimizers_config=want_opt if opt_changed else None,
+            quantization_config=want_quant if quant_changed else None,
+        )
 
 
+@timed("upsert")
 def upsert_point(client: QdrantClient, point_id: str, vector: List[float], payload: Dict[str, Any]) -> None:
-    pt = PointStruct(id=point_id, vector=vector, payload=payload)
-    client.upsert(collection_name=settings.qdrant_collection, points=[pt])
+    upsert_points(client, [(point_id, vector, payload)])
+
+
+def _estimate_point_bytes(vector: List[float], payload: Dict[str, Any]) -> int:
+    # REST/JSON floats take ~10 bytes each; good enough to stay under request size limits.
+    try:
+        payload_size = len(json.dumps(payload, ensure_ascii=False, default=str))
+    except Exception:
+        payload_size = 1024
+    return len(vector) * 10 + payload_size + 64
+
+
+def _point_struct(pid: Any, vec: List[float], payload: Dict[str, Any], sparse: bool) -> PointStruct:
+    """PointStruct for one point, with the BM25 sparse vector of its caption + tags if `sparse`."""
+    if not sparse:
+        return PointStruct(id=pid, vector=vec, payload=payload)
+    tokens = tokenize(document_text(payload.get("caption", ""), payload.get("tags") or []))
+    vectors: Dict[str, Any] = {"": vec}
+    if tokens:
+        indices, values = document_vector(tokens)
+        vectors[SPARSE_VECTOR] = SparseVector(indices=indices, values=values)
+    return PointStruct(id=pid, vector=vectors, payload=payload)
+
+
+def _chunk_points(
+    points: Iterable[Tuple[Any, List[float], Dict[str, Any]]],
+    chunk_size: int,
+    max_bytes: int,
+    sparse: bool = False,
+) -> Iterator[List[PointStruct]]:
+    chunk: List[PointStruct] = []
+    size = 0
+    for pid, vec, payload in points:
+        n = _estimate_point_bytes(vec, payload)
+        if chunk and (len(chunk) >= chunk_size or size + n > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(_point_struct(pid, vec, payload, sparse))
+        size += n
+    if chunk:
+        yield chunk
+
+
+@timed("upsert")
+def upsert_points(
+    client: QdrantClient,
+    points: Iterable[Tuple[Any, List[float], Dict[str, Any]]],
+    chunk_size: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    parallel: Optional[int] = None,
+    wait: bool = True,
+    confirm: bool = True,
+    collection_name: Optional[str] = None,
+) -> int:
+    """Bulk upsert of (id, vector, payload) points. Returns the number of points sent.
+
+    Points are streamed into chunks bounded by count and estimated request bytes; up to
+    `parallel` chunks are in flight at once. With `wait=False` Qdrant acknowledges each
+    chunk before applying it; unless `confirm=False`, we then check at the end that every
+    point is visible (see `confirm_points`). If the collection has the BM25 sparse vector,
+    it is built locally from each payload's caption + tags.
+    """
+    chunk_size = max(1, chunk_size or settings.upsert_batch_size)
+    max_bytes = max(1, max_bytes or settings.upsert_max_bytes)
+    parallel = 1 if is_local(client) else max(1, parallel or settings.upsert_parallel)
+
+    name = collection_name or settings.qdrant_collection
+    sparse = has_sparse_vector(client, name)
+    ids: List[Any] = []
+
+    def send(chunk: List[PointStruct]) -> None:
+        with _write_lock(client):
+            client.upsert(collection_name=name, points=chunk, wait=wait)
+
+    try:
+        if parallel == 1:
+            for chunk in _chunk_points(points, chunk_size, max_bytes, sparse):
+                send(chunk)
+                ids.extend(p.id for p in chunk)
+        else:
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                in_flight: Set[Future] = set()
+                for chunk in _chunk_points(points, chunk_size, max_bytes, sparse):
+                    if len(in_flight) >= parallel * 2:
+                        done, in_flight = wait_futures(in_flight, return_when=FIRST_COMPLETED)
+                        for f in done:
+                            f.result()
+                    in_flight.add(pool.submit(send, chunk))
+                    ids.extend(p.id for p in chunk)
+                for f in in_flight:
+                    f.result()
+    finally:
+        if ids:
+            bump_version()  # after the writes (also partial ones), so no stale result is cached as current
+
+    if not wait and confirm and ids:
+        confirm_points(client, ids, collection_name=name)
+    return len(ids)
+
+
+def existing_ids(
+    client: QdrantClient, ids: Iterable[Any], chunk_size: int = 1000, collection_name: Optional[str] = None
+) -> Set[str]:
+    """Return (as strings) which of `ids` already exist, using batched `retrieve` calls."""
+    ids = [_as_point_id(pid) for pid in ids]
+    found: Set[str] = set()
+    for i in range(0, len(ids), chunk_size):
+        res = client.retrieve(
+            collection_name=collection_name or settings.qdrant_collection,
+            ids=ids[i : i + chunk_size],
+            with_payload=False,
+            with_vectors=False,
+        )
+        found.update(str(p.id) for p in res)
+    return found
+
+
+def get_point(client: QdrantClient, point_id: Any) -> Optional[Dict[str, Any]]:
+    """{"id", "payload"} of one point, or None if it doesn't exist."""
+    res = client.retrieve(
+        collection_name=settings.qdrant_collection,
+        ids=[_as_point_id(point_id)],
+        with_payload=True,
+        with_vectors=False,
+    )
+    if not res:
+        return None
+    return {"id": str(res[0].id), "payload": res[0].payload or {}}
+
+
+def confirm_points(
+    client: QdrantClient, ids: List[Any], timeout: float = 60.0, collection_name: Optional[str] = None
+) -> None:
+    """Block until all `ids` are visible in the collection (after `wait=False` upserts)."""
+    pending = list(ids)
+    deadline = time.time() + timeout
+    delay = 0.05
+    while pending:
+        got = existing_ids(client, pending, collection_name=collection_name)
+        pending = [x for x in pending if str(x) not in got]
+        if not pending:
+            bump_version()  # wait=False writes become visible only now
+            return
+        if time.time() > deadline:
+            raise RuntimeError(f"{len(pending)} points not confirmed after {timeout:.0f}s (e.g. id={pending[0]}).")
+        time.sleep(delay)
+        delay = min(1.0, delay * 2)
 
 
 def build_source_filter(source_choice: str | None) -> Optional[Filter]:
@@ -77,36 +450,57 @@ def build_source_filter(source_choice: str | None) -> Optional[Filter]:
     return None
 
 
+@timed("search")
 def search(
     client: QdrantClient,
     vector: List[float],
     top_k: int,
     qfilter: Optional[Filter] = None,
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    rescore: Optional[bool] = None,
+    oversampling: Optional[float] = None,
+    with_payload: bool | List[str] = True,
+    collection_name: Optional[str] = None,
+    text: Optional[str] = None,
 ):
     """Compatibility layer for different qdrant-client versions.
 
     Some versions expose client.search(...),
     others expose client.query_points(...).
+    Search params (HNSW ef, quantization oversampling/rescore) default to Settings.
+    With `text`, runs hybrid dense + BM25 retrieval fused server-side (see hybrid_search).
     """
+    name = collection_name or settings.qdrant_collection
+    # Local mode is always exact brute force and warns about search params.
+    params = None if is_local(client) else _search_params(hnsw_ef, exact, rescore, oversampling)
+
+    if text and settings.hybrid_search and has_sparse_vector(client, name):
+        indices, values = query_vector(text)
+        if indices:
+            return hybrid_search(client, vector, (indices, values), top_k, qfilter, params, with_payload, name)
+
     # Common API
     if hasattr(client, "search"):
         return client.search(
-            collection_name=settings.qdrant_collection,
+            collection_name=name,
             query_vector=vector,
             limit=top_k,
             query_filter=qfilter,
-            with_payload=True,
+            search_params=params,
+            with_payload=with_payload,
             with_vectors=False,
         )
 
     # Alternative API (some versions)
     if hasattr(client, "query_points"):
         res = client.query_points(
-            collection_name=settings.qdrant_collection,
+            collection_name=name,
             query=vector,
             limit=top_k,
             query_filter=qfilter,
-            with_payload=True,
+            search_params=params,
+            with_payload=with_payload,
             with_vectors=False,
         )
         # Many versions return an object with .points
@@ -115,6 +509,145 @@ def search(
     raise AttributeError("Qdrant client has no supported search method (search/query_points).")
 
 
+def hybrid_search(
+    client: QdrantClient,
+    vector: List[float],
+    sparse: Tuple[List[int], List[float]],
+    top_k: int,
+    qfilter: Optional[Filter] = None,
+    params: Optional[SearchParams] = None,
+    with_payload: bool | List[str] = True,
+    collection_name: Optional[str] = None,
+):
+    """Dense and BM25 prefetches in one query, merged with reciprocal-rank fusion.
+
+    Scores are RRF scores (rank based), not cosine similarities.
+    """
+    res = client.query_points(
+        collection_name=collection_name or settings.qdrant_collection,
+        prefetch=_hybrid_prefetch(vector, sparse, top_k, qfilter, params),
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=top_k,
+        with_payload=with_payload,
+        with_vectors=False,
+    )
+    return res.points
+
+
+def _hybrid_prefetch(
+    vector: List[float],
+    sparse: Tuple[List[int], List[float]],
+    top_k: int,
+    qfilter: Optional[Filter],
+    params: Optional[SearchParams],
+) -> List[Prefetch]:
+    limit = max(top_k, settings.hybrid_prefetch_limit)
+    return [
+        Prefetch(query=vector, filter=qfilter, params=params, limit=limit),
+        Prefetch(
+            query=SparseVector(indices=sparse[0], values=sparse[1]),
+            using=SPARSE_VECTOR,
+            filter=qfilter,
+            limit=limit,
+        ),
+    ]
+
+
+@timed("search")
+def search_many(
+    client: QdrantClient,
+    vectors: Sequence[Any],
+    top_k: int | Sequence[int],
+    qfilters: Optional[Sequence[Optional[Filter]]] = None,
+    texts: Optional[Sequence[Optional[str]]] = None,
+    with_payload: bool | List[str] = True,
+    batch_size: int = 64,
+    collection_name: Optional[str] = None,
+) -> List[List[Any]]:
+    """Many searches with few round-trips (Qdrant batch query). One result list per vector.
+
+    `top_k` and `qfilters` may be given per query. With `texts`, each query is hybrid
+    (dense + BM25, RRF) like `search(..., text=...)`. A query may also be a point id instead
+    of a vector ("more like this", the point itself excluded).
+    """
+    name = collection_name or settings.qdrant_collection
+    n = len(vectors)
+    top_ks = [top_k] * n if isinstance(top_k, int) else list(top_k)
+    filters = list(qfilters) if qfilters is not None else [None] * n
+    hybrid = bool(texts) and settings.hybrid_search and has_sparse_vector(client, name)
+    params = None if is_local(client) else _search_params()
+
+    requests: List[QueryRequest] = []
+    for i, vec in enumerate(vectors):
+        if not isinstance(vec, list):
+            requests.append(
+                QueryRequest(
+                    query=_as_point_id(vec), filter=filters[i], params=params, limit=top_ks[i], with_payload=with_payload
+                )
+            )
+            continue
+        sparse = query_vector(texts[i] or "") if hybrid and texts is not None else ([], [])
+        if sparse[0]:
+            req = QueryRequest(
+                prefetch=_hybrid_prefetch(vec, sparse, top_ks[i], filters[i], params),
+                query=FusionQuery(fusion=Fusion.RRF),
+                limit=top_ks[i],
+                with_payload=with_payload,
+            )
+        else:
+            req = QueryRequest(query=vec, filter=filters[i], params=params, limit=top_ks[i], with_payload=with_payload)
+        requests.append(req)
+
+    out: List[List[Any]] = []
+    for i in range(0, n, max(1, batch_size)):
+        responses = client.query_batch_points(collection_name=name, requests=requests[i : i + batch_size])
+        out.extend(r.points for r in responses)
+    return out
+
+
+@timed("search")
+def search_similar(
+    client: QdrantClient,
+    point_id: Any,
+    top_k: int,
+    qfilter: Optional[Filter] = None,
+    include_self: bool = False,
+    collection_name: Optional[str] = None,
+):
+    """"More like this": search with the stored vector of an indexed point (no embedding call).
+
+    Query-by-id excludes the point itself; `include_self=True` fetches its vector and runs a
+    plain search instead (used when the query is an uploaded copy of that image). Raises
+    ValueError if the point doesn't exist (any more).
+    """
+    name = collection_name or settings.qdrant_collection
+    pid = _as_point_id(point_id)
+    if include_self or not hasattr(client, "query_points"):
+        recs = client.retrieve(collection_name=name, ids=[pid], with_payload=False, with_vectors=True)
+        vector = dense_vector(recs[0].vector) if recs else None
+        if vector is None:
+            raise ValueError(f"Point {point_id} not found.")
+        results = search(client, vector, top_k + (0 if include_self else 1), qfilter, collection_name=name)
+        return results if include_self else [r for r in results if str(r.id) != str(pid)][:top_k]
+
+    try:
+        res = client.query_points(
+            collection_name=name,
+            query=pid,
+            limit=top_k,
+            query_filter=qfilter,
+            search_params=None if is_local(client) else _search_params(),
+            with_payload=True,
+            with_vectors=False,
+        )
+    except Exception:
+        # Same error as the retrieve path when the point is gone (deleted since the link was made).
+        if not existing_ids(client, [pid], collection_name=name):
+            raise ValueError(f"Point {point_id} not found.")
+        raise
+    return res.points
+
+
 def list_points(client: QdrantClient, limit: int = 1000) -> List[Dict[str, Any]]:
     """Return latest points (best-effort). Uses scroll; ordering is not guaranteed by Qdrant,
     but works well enough for a gallery in a course project.
@@ -144,8 +677,238 @@ def list_points(client: QdrantClient, limit: int = 1000) -> List[Dict[str, Any]]
     return points[:limit]
 
 
-def delete_points_by_filter(client: QdrantClient, qfilter: Filter) -> None:
-    client.delete(
+GALLERY_FIELDS = ["filename", "caption", "tags", "stock", "added_at"]
+
+
+def _merge_filters(base: Optional[Filter], extra: Optional[Filter]) -> Optional[Filter]:
+    if base is None:
+        return extra
+    if extra is None:
+        return base
+    return Filter(
+        must=list(base.must or []) + list(extra.must or []),
+        should=base.should,
+        must_not=list(base.must_not or []) + list(extra.must_not or []),
+    )
+
+
+def _as_point_id(pid: Any) -> Any:
+    """Gallery items carry ids as strings; Qdrant needs ints back for numeric ids."""
+    return int(pid) if isinstance(pid, str) and pid.isdigit() else pid
+
+
+def _order_by_unsupported(exc: Exception) -> bool:
+    """True when `exc` only says the client/server can't do an ordered scroll on `added_at`."""
+    if isinstance(exc, TypeError):  # qdrant-client < 1.8: no `order_by` keyword
+        return "order_by" in str(exc)
+    if isinstance(exc, UnexpectedResponse) and exc.status_code in (400, 422):
+        content = bytes(exc.content or b"")
+        return b"order_by" in content or b"range index" in content
+    return False
+
+
+def _added_at(item: Dict[str, Any]) -> int:
+    return int(item["payload"].get("added_at") or 0)
+
+
+def _scroll_group(
+    client: QdrantClient,
+    qfilter: Optional[Filter],
+    added_at: int,
+    offset: Any,
+    limit: int,
+) -> Tuple[List[Dict[str, Any]], Any]:
+    """Points with exactly this `added_at`, in id order (Qdrant's plain scroll order), from `offset`."""
+    batch, next_offset = client.scroll(
         collection_name=settings.qdrant_collection,
-        points_selector=PointsSelector(filter=qfilter),
+        scroll_filter=_merge_filters(qfilter, Filter(must=[FieldCondition(key="added_at", match=MatchValue(value=added_at))])),
+        limit=limit,
+        offset=offset,
+        with_payload=GALLERY_FIELDS,
+        with_vectors=False,
     )
+    return [{"id": str(p.id), "payload": p.payload or {}} for p in batch], next_offset
+
+
+def _gallery_page_fallback(
+    client: QdrantClient,
+    page_size: int,
+    source_choice: str | None,
+    cursor: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Scroll-then-sort for clients/servers without ordered scroll; same (added_at, id) cursor."""
+    items = list_points(client, limit=100_000)
+    if source_choice in ("Stock", "User uploads"):
+        want = source_choice == "Stock"
+        items = [it for it in items if it["payload"].get("stock") is want]
+    items.sort(key=lambda it: (-_added_at(it), str(_as_point_id(it["id"]))))
+    if cursor:
+        top = cursor["added_at"]
+        if "offset" not in cursor:
+            items = [it for it in items if _added_at(it) < top]
+        else:
+            after = str(_as_point_id(cursor["offset"]))
+            items = [
+                it for it in items
+                if _added_at(it) < top or (_added_at(it) == top and str(_as_point_id(it["id"])) >= after)
+            ]
+    page = items[:page_size]
+    if len(items) <= page_size:
+        return page, None
+    nxt = items[page_size]
+    if _added_at(nxt) == _added_at(page[-1]):
+        return page, {"added_at": _added_at(nxt), "offset": nxt["id"]}
+    return page, {"added_at": _added_at(page[-1])}
+
+
+def list_gallery_page(
+    client: QdrantClient,
+    page_size: int,
+    source_choice: str | None = None,
+    cursor: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """One gallery page, newest first, plus the cursor for the next page (None on the last page).
+
+    Uses a server-side ordered scroll over the `added_at` payload index, with the
+    stock/user filter applied by Qdrant and only GALLERY_FIELDS returned, so a page
+    costs O(page_size) regardless of collection size.
+
+    The sort key is (added_at, id): `added_at` has one-second resolution, so a bulk import
+    shares one value across many points. A cursor is either {"added_at": t} ("everything
+    older than t") or {"added_at": t, "offset": id} ("the rest of second t from point id,
+    then everything older"); a second split across pages is read in id order with a plain
+    scroll, so the cursor stays constant-size however many points share a timestamp.
+    """
+    qfilter = build_source_filter(source_choice)
+    items: List[Dict[str, Any]] = []
+    group: Optional[int] = None
+    offset: Any = None
+    below: Optional[int] = None
+    if cursor:
+        if "offset" in cursor:
+            group, offset = int(cursor["added_at"]), cursor["offset"]
+        else:
+            below = int(cursor["added_at"])
+
+    try:
+        while True:
+            need = page_size - len(items)
+            if group is not None:
+                batch, next_offset = _scroll_group(client, qfilter, group, offset, need)
+                items.extend(batch)
+                if next_offset is not None:
+                    return items, {"added_at": group, "offset": next_offset}
+                below, group = group, None
+                if len(items) >= page_size:
+                    return items, {"added_at": below}
+                continue
+
+            older = None
+            if below is not None:
+                older = Filter(must=[FieldCondition(key="added_at", range=Range(lt=below))])
+            batch, _ = client.scroll(
+                collection_name=settings.qdrant_collection,
+                scroll_filter=_merge_filters(qfilter, older),
+                limit=need + 1,
+                order_by=OrderBy(key="added_at", direction=Direction.DESC),
+                with_payload=GALLERY_FIELDS,
+                with_vectors=False,
+            )
+            batch_items = [{"id": str(p.id), "payload": p.payload or {}} for p in batch]
+            if len(batch_items) <= need:
+                return items + batch_items, None
+            edge = _added_at(batch_items[need - 1])
+            if _added_at(batch_items[need]) != edge:
+                return items + batch_items[:need], {"added_at": edge}
+            # The page boundary splits a second: keep the strictly newer points and read
+            # that second in id order so the next cursor can point inside it.
+            items.extend(it for it in batch_items[:need] if _added_at(it) > edge)
+            group, offset = edge, None
+    except Exception as e:
+        if not _order_by_unsupported(e):
+            raise
+        return _gallery_page_fallback(client, page_size, source_choice, cursor)
+
+
+def count_points(client: QdrantClient, source_choice: str | None = None) -> int:
+    try:
+        res = client.count(
+            collection_name=settings.qdrant_collection,
+            count_filter=build_source_filter(source_choice),
+            exact=False,
+        )
+        return int(res.count)
+    except Exception:
+        return 0
+
+
+def dense_vector(vector: Any) -> Optional[List[float]]:
+    """The dense vector of a retrieved record (collections with a sparse vector return a dict of vectors)."""
+    if isinstance(vector, dict):
+        vector = vector.get("")
+    return vector if isinstance(vector, list) else None
+
+
+def iter_points(
+    client: QdrantClient,
+    with_payload: bool | List[str] = True,
+    qfilter: Optional[Filter] = None,
+    batch_size: int = 256,
+    with_vectors: bool = False,
+    collection_name: Optional[str] = None,
+) -> Iterator[Any]:
+    """Stream every point record via paginated scroll."""
+    offset = None
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection_name or settings.qdrant_collection,
+            scroll_filter=qfilter,
+            limit=batch_size,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            offset=offset,
+        )
+        yield from batch
+        if offset is None or not batch:
+            return
+
+
+def set_payloads(client: QdrantClient, items: Iterable[Tuple[Any, Dict[str, Any]]], chunk_size: int = 128) -> int:
+    """Merge per-point payload updates, many points per request. Returns the number of points updated."""
+    ops: List[SetPayloadOperation] = []
+    n = 0
+    for pid, payload in items:
+        ops.append(SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[pid])))
+        if len(ops) >= chunk_size:
+            with _write_lock(client):
+                client.batch_update_points(collection_name=settings.qdrant_collection, update_operations=ops)
+            n += len(ops)
+            ops = []
+    if ops:
+        with _write_lock(client):
+            client.batch_update_points(collection_name=settings.qdrant_collection, update_operations=ops)
+        n += len(ops)
+    if n:
+        bump_version()
+    return n
+
+
+def delete_points_by_filter(client: QdrantClient, qfilter: Filter) -> None:
+    with _write_lock(client):
+        client.delete(
+            collection_name=settings.qdrant_collection,
+            points_selector=PointsSelector(filter=qfilter),
+        )
+    bump_version()
+    bump_version(QDRANT_DELETES)
+
+
+def delete_points(client: QdrantClient, ids: List[Any]) -> None:
+    if ids:
+        with _write_lock(client):
+            client.delete(
+                collection_name=settings.qdrant_collection,
+                points_selector=PointIdsList(points=list(ids)),
+            )
+        bump_version()
+        bump_version(QDRANT_DELETES)
@@ -2,36 +2,43 @@ from __future__ import annotations
 
 import time
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 import streamlit as st
-from PIL import Image
 
+from src.features.bulk_upload import run_bulk_index, stage_uploads
+from src.features.dedup import find_near_duplicate, remember
 from src.features.embedding import embed_text
-from src.features.vision import describe_image, pil_to_png_bytes, parse_caption_and_tags
-from src.services.qdrant_service import upsert_point
-from src.utils.ids import stable_id_from_bytes
-from src.utils.pending import add_pending, load_pending, remove_pending_by_id
+from src.features.jobs import Job, get_job_runner
+from src.features.pending_worker import caption_pending_item, get_pending_worker
+from src.features.preprocess import PreparedImage, prepare_image
+from src.features.vision import describe_image, parse_caption_and_tags
+from src.services.qdrant_service import collection_vector_size, get_point, upsert_point
+from src.utils.pending import add_pending, load_pending, remove_pending_by_id, retry_all_now
 from src.utils.history import append_history
+from src.utils.phash import from_hex, to_hex
+from src.utils.thumbnails import make_thumbnail, thumbnail_for
+from src.utils.timing import Timings, collect
 
 
-def _save_image(img: Image.Image, images_dir: Path, filename: str) -> Path:
+def _save_image(raw: bytes, images_dir: Path, filename: str) -> Path:
+    # Keep the original bytes: the point id is a hash of them (see preprocess.content_id).
     images_dir.mkdir(parents=True, exist_ok=True)
     out = images_dir / filename
-    img.save(out)
+    out.write_bytes(raw)
     return out
 
 
 def _index_one(
     qdrant_client,
-    img: Image.Image,
-    img_bytes: bytes,
+    point_id: int,
     filename: str,
     caption: str,
     tags: list[str],
     source: str,
+    phash: str = "",
 ) -> None:
-    point_id = stable_id_from_bytes(img_bytes)
-    vector = embed_text(caption)  # raises if OpenAI embeddings unavailable
+    vector = embed_text(caption, dimensions=collection_vector_size(qdrant_client))  # raises if OpenAI embeddings unavailable
     payload = {
         "filename": filename,
         "caption": caption,
@@ -40,25 +47,289 @@ def _index_one(
         "source": source,
         "added_at": int(time.time()),
     }
+    if phash:
+        payload["phash"] = phash
     upsert_point(qdrant_client, point_id=point_id, vector=vector, payload=payload)
+    remember(qdrant_client, from_hex(phash), point_id)
     remove_pending_by_id(str(point_id))
 
 
+def _retry_pending(qdrant_client, item: Dict[str, Any]) -> None:
+    """Index one pending upload now; items queued without a caption are captioned first."""
+    item = dict(item)
+    if not item.get("caption"):
+        caption_pending_item(item)
+    _index_one(
+        qdrant_client,
+        int(item["id"]),
+        item["filename"],
+        item["caption"],
+        item.get("tags") or [],
+        source="pending_retry",
+        phash=item.get("phash", ""),
+    )
+
+
+def _index_upload_job(
+    job: Job,
+    qdrant_client,
+    point_id: int,
+    rel_fname: str,
+    prepared: PreparedImage,
+    caption_raw: str,
+    tags: list[str],
+    use_ai_caption: bool,
+    timings: Optional[Dict[str, float]] = None,
+) -> dict:
+    """Runs on the job runner: thumbnail, caption (if needed), embed and upsert.
+
+    Embedding/indexing failures put the upload into the pending queue, so it is never lost.
+    `timings` carries the stages already measured in the UI thread (preprocess).
+    """
+    with collect(timings) as t:
+        return _index_upload(job, qdrant_client, point_id, rel_fname, prepared, caption_raw, tags, use_ai_caption, t)
+
+
+def _index_upload(
+    job: Job,
+    qdrant_client,
+    point_id: int,
+    rel_fname: str,
+    prepared: PreparedImage,
+    caption_raw: str,
+    tags: list[str],
+    use_ai_caption: bool,
+    timings: Timings,
+) -> dict:
+    try:
+        make_thumbnail(prepared.image, point_id)
+    except Exception:
+        pass  # the grid generates it lazily later
+
+    if not caption_raw and use_ai_caption:
+        job.stage = "caption"
+        try:
+            caption_raw = describe_image(prepared.data, content_id=point_id, mime=prepared.mime)
+            if not caption_raw:
+                raise RuntimeError("Empty caption from VLM.")
+        except Exception as e:
+            # The file is already saved: queue it without a caption, the pending worker captions it later.
+            error = f"[caption] {e}"[:500]
+            add_pending(
+                {
+                    "id": str(point_id),
+                    "filename": rel_fname,
+                    "caption": "",
+                    "tags": tags,
+                    "phash": to_hex(prepared.phash),
+                    "source": "user_upload",
+                    "error": error,
+                }
+            )
+            append_history(
+                {
+                    "mode": "add",
+                    "status": "caption_failed",
+                    "id": str(point_id),
+                    "error": str(e)[:300],
+                    "timings": timings.to_dict(),
+                }
+            )
+            return {"pending": True, "error": error}
+    if not caption_raw:
+        Path(rel_fname).unlink(missing_ok=True)  # nothing will ever index it
+        raise RuntimeError("Caption is required (either provide it manually or enable AI captioning).")
+
+    caption, parsed_tags = parse_caption_and_tags(caption_raw)
+    # merge tags (manual + parsed) unique
+    tags = sorted(set(tags) | set(parsed_tags))
+    job.result.update({"id": str(point_id), "filename": rel_fname, "caption": caption, "tags": tags})
+
+    job.stage = "index"
+    phash = to_hex(prepared.phash)
+    try:
+        _index_one(qdrant_client, point_id, rel_fname, caption, tags, source="user_upload", phash=phash)
+    except Exception as e:
+        add_pending(
+            {
+                "id": str(point_id),
+                "filename": rel_fname,
+                "caption": caption,
+                "tags": tags,
+                "phash": phash,
+                "error": str(e)[:500],
+            }
+        )
+        append_history(
+            {
+                "mode": "add",
+                "status": "pending",
+                "id": str(point_id),
+                "error": str(e)[:300],
+                "timings": timings.to_dict(),
+            }
+        )
+        return {"pending": True, "error": str(e)[:500]}
+
+    append_history(
+        {
+            "mode": "add",
+            "status": "indexed",
+            "id": str(point_id),
+            "filename": rel_fname,
+            "caption": caption,
+            "tags": tags,
+            "timings": timings.to_dict(),
+        }
+    )
+    return {}
+
+
+def _render_bulk_status(job: Job) -> None:
+    stats = job.result.get("stats") or {}
+    files = list((job.result.get("files") or {}).values())
+    total = max(1, int(stats.get("submitted") or 0))
+    finished = sum(int(stats.get(k) or 0) for k in ("done", "skipped", "failed"))
+    counts: dict = {}
+    for rec in files:
+        counts[rec["status"]] = counts.get(rec["status"], 0) + 1
+    summary = " • ".join(f"{k}: {v}" for k, v in sorted(counts.items()))
+
+    if job.status == "failed":
+        st.error(f"**{job.label}** — {job.error}")
+    elif job.finished:
+        st.success(f"**{job.label}** — finished in {job.finished_ts - job.created_ts:.1f}s ({summary})")
+    else:
+        st.progress(
+            min(1.0, finished / total),
+            text=f"**{job.label}** — {finished}/{total} • {stats.get('images_per_s', 0.0)} img/s • {summary}",
+        )
+    if counts.get("pending"):
+        st.caption(f"{counts['pending']} file(s) moved to the pending queue and will be retried automatically.")
+    with st.expander("Per-file status", expanded=False):
+        st.dataframe(files, use_container_width=True, hide_index=True)
+
+
+def _render_job_status(job: Job) -> None:
+    if job.kind == "bulk":
+        _render_bulk_status(job)
+    elif not job.finished:
+        st.info(f"⏳ **{job.label}** — {job.stage or job.status}…")
+    elif job.status == "failed":
+        st.error(f"**{job.label}** — {job.error}")
+    elif job.result.get("pending"):
+        st.warning(
+            f"**{job.label}** — {'captioning' if job.result.get('error', '').startswith('[caption]') else 'indexing'} "
+            "failed, saved as pending. It will be retried automatically (see Pending uploads below)."
+        )
+        st.code(job.result.get("error", ""))
+    else:
+        took = job.finished_ts - job.created_ts
+        st.success(f"**{job.label}** — indexed successfully ✅ ({took:.1f}s)")
+        st.caption(job.result.get("caption", ""))
+
+
+def _render_jobs() -> None:
+    """Status of this session's indexing jobs; polls while any of them is still running."""
+    ids = st.session_state.get("add_jobs") or []
+    if not ids:
+        return
+    runner = get_job_runner()
+    active = any(not j.finished for j in runner.list_jobs(ids))
+
+    def body() -> None:
+        jobs = runner.list_jobs(ids[:20])
+        for job in jobs:
+            _render_job_status(job)
+        if jobs and all(j.finished for j in jobs) and st.button("Clear finished", key="clear_add_jobs"):
+            st.session_state["add_jobs"] = []
+            st.rerun()
+
+    fragment = getattr(st, "fragment", None)
+    if active and fragment is not None:
+        fragment(body, run_every=1.0)()
+    else:
+        body()
+
+
+def _render_duplicate_notice(qdrant_client, dup_id: str, distance: int) -> bool:
+    """Show the already-indexed match; returns True if the user still wants to index."""
+    match = None
+    try:
+        match = get_point(qdrant_client, int(dup_id) if dup_id.isdigit() else dup_id)
+    except Exception:
+        pass
+    fname = ((match or {}).get("payload") or {}).get("filename", "")
+    how = "identical" if distance == 0 else f"near-identical, distance {distance}/64"
+    st.info(f"Already indexed as **{dup_id}** ({how}){f' — {fname}' if fname else ''}.")
+    thumb = thumbnail_for(fname, dup_id) if fname else None
+    if thumb is not None:
+        st.image(str(thumb), width=200)
+    return st.checkbox("Index anyway", value=False)
+
+
+def _render_bulk(qdrant_client, images_dir: Path) -> None:
+    st.caption(
+        "Select many images or .zip archives. Files are saved first, then captioned, embedded and "
+        "indexed in the background; duplicates of already indexed images are skipped."
+    )
+    uploads = st.file_uploader(
+        "Upload images or .zip archives",
+        type=["png", "jpg", "jpeg", "zip"],
+        accept_multiple_files=True,
+        key="bulk_uploader",
+    )
+    if uploads and st.button(f"Index {len(uploads)} upload(s)", type="primary"):
+        with st.spinner("Saving files…"):
+            staged, rejected = stage_uploads(uploads, images_dir / "user")
+        if not staged:
+            st.error("No images found in the upload.")
+        else:
+            label = uploads[0].name if len(uploads) == 1 else f"{len(uploads)} uploads"
+            job_id = get_job_runner().submit(
+                "bulk", run_bulk_index, qdrant_client, staged, rejected, label=f"{label} ({len(staged)} images)"
+            )
+            st.session_state.setdefault("add_jobs", []).insert(0, job_id)
+            append_history({"mode": "bulk_add", "status": "queued", "files": len(staged), "rejected": len(rejected)})
+
+    _render_jobs()
+    st.divider()
+    _render_pending(qdrant_client, images_dir)
+
+
 def render_add(qdrant_client, images_dir: Path):
     st.subheader("Add photo")
 
+    if st.radio("Upload", ["Single image", "Bulk (files / .zip)"], horizontal=True, key="add_mode") != "Single image":
+        _render_bulk(qdrant_client, images_dir)
+        return
+
     st.caption(
         "Tip: If AI captioning fails, you can provide caption/tags manually. "
-        "If embedding/indexing fails, the upload is kept as *pending* and you can re-index later."
+        "If embedding/indexing fails, the upload is kept as *pending* and re-indexed automatically in the background."
     )
 
     up = st.file_uploader("Upload image to index", type=["png", "jpg", "jpeg"])
     if up is None:
+        _render_jobs()
         _render_pending(qdrant_client, images_dir)
         return
 
-    img = Image.open(up).convert("RGB")
-    st.image(img, caption="Uploaded image", use_container_width=True)
+    raw = up.getvalue()
+    try:
+        with collect() as prep_timings:
+            prepared = prepare_image(raw)
+        prep_spans = prep_timings.to_dict()
+    except Exception as e:
+        st.error(f"Could not read image: {e}")
+        return
+    st.image(prepared.image, caption="Uploaded image", use_container_width=True)
+
+    # Perceptual-hash lookup before any paid call: re-saved/resized copies are caught too.
+    index_anyway = True
+    near = find_near_duplicate(qdrant_client, prepared.phash)
+    if near is not None:
+        index_anyway = _render_duplicate_notice(qdrant_client, *near)
 
     use_ai_caption = st.checkbox("Use AI to generate caption + tags", value=True)
 
@@ -71,75 +342,38 @@ def render_add(qdrant_client, images_dir: Path):
         placeholder="forest, fog, morning, nature",
     )
 
-    if st.button("Index image", type="primary"):
-        img_bytes = pil_to_png_bytes(img)
-        point_id = stable_id_from_bytes(img_bytes)
-
-        # Decide caption/tags
+    if st.button("Index image", type="primary", disabled=not index_anyway):
+        point_id = prepared.content_id
         caption_raw = manual_caption.strip()
         tags = [t.strip() for t in manual_tags.split(",") if t.strip()]
-
-        if not caption_raw and use_ai_caption:
-            try:
-                caption_raw = describe_image(img_bytes)
-            except Exception as e:
-                st.warning(f"AI caption failed: {e}. Please enter caption manually.")
-                append_history({"mode": "add", "status": "caption_failed", "error": str(e)[:300]})
-                return
-
-        if not caption_raw:
+        if not caption_raw and not use_ai_caption:
             st.error("Caption is required (either provide it manually or enable AI captioning).")
             return
 
-        caption, parsed_tags = parse_caption_and_tags(caption_raw)
-        # merge tags (manual + parsed) unique
-        tags = sorted(set(tags) | set(parsed_tags))
-
-        # Save image locally
+        # Persist the upload, then hand the slow part (caption, embed, upsert) to the job runner.
         user_dir = images_dir / "user"
-        user_dir.mkdir(parents=True, exist_ok=True)
-        filename = f"{point_id}.png"
-        _save_image(img, user_dir, filename)
-
+        ext = Path(up.name or "").suffix.lower() or ".png"
+        filename = f"{point_id}{ext}"
+        _save_image(raw, user_dir, filename)
         rel_fname = str(Path("data/images/user") / filename)
 
-        try:
-            _index_one(
-                qdrant_client,
-                img,
-                img_bytes,
-                rel_fname,
-                caption,
-                tags,
-                source="user_upload",
-            )
-            st.success("Indexed successfully ✅")
-            append_history(
-                {
-                    "mode": "add",
-                    "status": "indexed",
-                    "id": str(point_id),
-                    "filename": rel_fname,
-                    "caption": caption,
-                    "tags": tags,
-                }
-            )
-        except Exception as e:
-            # store pending
-            add_pending(
-                {
-                    "id": str(point_id),
-                    "filename": rel_fname,
-                    "caption": caption,
-                    "tags": tags,
-                    "error": str(e)[:500],
-                }
-            )
-            st.warning(
-                "Indexing failed — saved as pending. You can retry later from the Pending section below."
-            )
-            st.code(str(e))
-            append_history({"mode": "add", "status": "pending", "id": str(point_id), "error": str(e)[:300]})
+        job_id = get_job_runner().submit(
+            "add",
+            _index_upload_job,
+            qdrant_client,
+            point_id,
+            rel_fname,
+            prepared,
+            caption_raw,
+            tags,
+            use_ai_caption,
+            timings=prep_spans,
+            label=up.name or filename,
+        )
+        st.session_state.setdefault("add_jobs", []).insert(0, job_id)
+        st.toast(f"Queued {up.name or filename} for indexing.")
+
+    _render_jobs()
 
     st.divider()
     _render_pending(qdrant_client, images_dir)
@@ -153,7 +387,21 @@ def _render_pending(qdrant_client, images_dir: Path):
         st.caption("No pending uploads.")
         return
 
-    st.write(f"Pending items: **{len(pending)}**")
+    worker = get_pending_worker()
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        st.write(f"Pending items: **{len(pending)}**")
+        if worker is not None:
+            st.caption(
+                f"Background retry is on (indexed {worker.indexed}, failed attempts {worker.failed} since app start)."
+            )
+    with c2:
+        if st.button("Retry all", key="retry_all_pending"):
+            n = retry_all_now()
+            if worker is not None:
+                worker.wake()
+            append_history({"mode": "pending_retry", "status": "queued", "count": n})
+            st.success(f"Queued {n} item(s) for immediate retry.")
 
     # IMPORTANT: use enumerate to ensure Streamlit widget keys are always unique,
     # even if pending contains duplicate ids.
@@ -171,6 +419,10 @@ def _render_pending(qdrant_client, images_dir: Path):
 
             st.write({"caption": caption, "tags": tags})
 
+            attempts = int(item.get("attempts") or 0)
+            if attempts:
+                wait_s = max(0, int(float(item.get("next_attempt_ts") or 0) - time.time()))
+                st.caption(f"Attempts: {attempts} • next attempt in {wait_s}s")
             if err:
                 st.caption(f"Last error: {err}")
 
@@ -182,17 +434,7 @@ def _render_pending(qdrant_client, images_dir: Path):
                         if not p.exists():
                             st.error("File not found on disk.")
                         else:
-                            img = Image.open(p).convert("RGB")
-                            img_bytes = pil_to_png_bytes(img)
-                            _index_one(
-                                qdrant_client,
-                                img,
-                                img_bytes,
-                                fname,
-                                caption,
-                                tags,
-                                source="pending_retry",
-                            )
+                            _retry_pending(qdrant_client, item)
                             st.success("Indexed ✅")
                             append_history({"mode": "pending_retry", "status": "indexed", "id": str(pid)})
                             st.rerun()
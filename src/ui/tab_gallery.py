@@ -1,9 +1,22 @@
 from __future__ import annotations
 
-from pathlib import Path
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
 import streamlit as st
 
-from src.services.qdrant_service import list_points
+from src.services.qdrant_service import count_points, list_gallery_page
+from src.ui.tab_search import MORE_LIKE_THIS, request_similar
+from src.utils.thumbnails import thumbnail_for
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def _fetch_page(
+    _qdrant_client, source_choice: str, page_size: int, cursor_json: str
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    # cursor passed as JSON so it is hashable for the cache; the client is excluded (leading _).
+    cursor = json.loads(cursor_json) if cursor_json else None
+    return list_gallery_page(_qdrant_client, page_size, source_choice, cursor)
 
 
 def render_gallery(qdrant_client):
@@ -17,34 +30,61 @@ def render_gallery(qdrant_client):
     with col3:
         page_size = st.selectbox("Page size", [12, 24, 36, 48], index=1)
 
-    items = list_points(qdrant_client, limit=500)
-    if not items:
+    # Cursor stack: cursors[i] is where page i+1 starts. Reset when the query changes.
+    view_key = (source_choice, page_size)
+    if st.session_state.get("gallery_view") != view_key:
+        st.session_state["gallery_view"] = view_key
+        st.session_state["gallery_cursors"] = [None]
+    cursors: List[Optional[Dict[str, Any]]] = st.session_state["gallery_cursors"]
+    page_no = len(cursors)
+
+    cursor = cursors[-1]
+    items, next_cursor = _fetch_page(qdrant_client, source_choice, page_size, json.dumps(cursor) if cursor else "")
+    if not items and page_no == 1:
         st.info("No images indexed yet. Use 'Add photo' or run seed script.")
         return
 
-    if source_choice == "Stock":
-        items = [it for it in items if (it.get("payload", {}) or {}).get("stock") is True]
-    elif source_choice == "User uploads":
-        items = [it for it in items if (it.get("payload", {}) or {}).get("stock") is False]
-
-    total = len(items)
+    total = count_points(qdrant_client, source_choice)
     pages = max(1, (total + page_size - 1) // page_size)
-    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
-    start = (page - 1) * page_size
-    end = min(total, start + page_size)
-    view = items[start:end]
+
+    nav1, nav2, nav3, nav4 = st.columns([1, 1, 1, 3])
+    with nav1:
+        if st.button("◀ Prev", disabled=page_no <= 1):
+            cursors.pop()
+            st.rerun()
+    with nav2:
+        if st.button("Next ▶", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    with nav3:
+        if st.button("Refresh"):
+            _fetch_page.clear()
+            st.rerun()
+    with nav4:
+        st.caption(f"Page {page_no} of ~{pages} • {total} images")
 
     cols = st.columns(grid_cols)
-    for i, it in enumerate(view):
+    for i, it in enumerate(items):
         payload = it.get("payload") or {}
         fn = payload.get("filename")
         cap = payload.get("caption", "")
         tags = payload.get("tags") or []
         with cols[i % grid_cols]:
-            if fn and Path(str(fn)).exists():
-                st.image(str(fn), use_container_width=True)
+            thumb = thumbnail_for(fn, it.get("id"))
+            if thumb is not None:
+                st.image(str(thumb), use_container_width=True)
+                # Originals are only loaded on demand.
+                key = f"orig_g_{it.get('id')}"
+                if st.toggle("Full size", key=key):
+                    st.image(str(fn), use_container_width=True)
             else:
                 st.write("(missing file)")
             st.caption(cap[:110] + ("..." if len(cap) > 110 else ""))
             if tags:
                 st.caption("#" + "  #".join(tags[:6]))
+            st.button(
+                MORE_LIKE_THIS,
+                key=f"mlt_g_{it.get('id')}",
+                on_click=request_similar,
+                args=(it.get("id"), fn or "", cap[:110], source_choice),
+            )
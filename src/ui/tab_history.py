@@ -8,8 +8,12 @@ from typing import Any, Dict, List, Tuple
 
 import streamlit as st
 
+from src.features.embedding import embed_texts
+from src.services.qdrant_service import build_source_filter, collection_vector_size, existing_ids, search_many
+from src.ui.tab_search import MORE_LIKE_THIS
 from src.utils.history import load_history, clear_history
 from src.utils.saved_searches import load_saved, add_saved, delete_saved
+from src.utils.stats import summarize
 
 
 def _fmt_ts(ts: int) -> str:
@@ -60,12 +64,19 @@ def _history_key(it: Dict[str, Any]) -> str:
 
 
 def _extract_params_from_history(it: Dict[str, Any]) -> Dict[str, Any]:
-    return {
+    params = {
         "search_mode": it.get("search_mode") or "Text → Image",
         "source_filter": it.get("source_filter") or "All",
         "top_k": int(it.get("top_k") or 10),
         "query_text": (it.get("query_text") or it.get("query_label") or "")[:500],
     }
+    if it.get("similar_to"):
+        # "More like this" searches (and image searches that matched an indexed copy) re-run
+        # from the stored point id, not from the label text.
+        params.update(
+            {"search_mode": MORE_LIKE_THIS, "similar_to": it["similar_to"], "filename": it.get("filename") or ""}
+        )
+    return params
 
 
 def _run_search_from_params(params: Dict[str, Any]) -> None:
@@ -78,7 +89,7 @@ def _run_search_from_params(params: Dict[str, Any]) -> None:
 def _render_timeline(items: List[Dict[str, Any]]) -> None:
     st.caption("Tip: click **Re-run** to open Search with the same parameters and run it automatically.")
 
-    for it in reversed(items):
+    for pos, it in reversed(list(enumerate(items))):
         ts = _fmt_ts(int(it.get("ts", 0)))
         mode = it.get("mode", "event")
         search_mode = it.get("search_mode", "")
@@ -94,7 +105,7 @@ def _render_timeline(items: List[Dict[str, Any]]) -> None:
         with st.expander(title, expanded=False):
             cols = st.columns([1, 1, 2, 2])
             with cols[0]:
-                if st.button("Re-run", key=f"rerun_{it.get('ts')}_{hash(q)}"):
+                if st.button("Re-run", key=f"rerun_{pos}_{it.get('ts')}_{hash(q)}"):
                     _run_search_from_params(_extract_params_from_history(it))
             with cols[1]:
                 st.write("**Query**")
@@ -113,8 +124,8 @@ def _render_timeline(items: List[Dict[str, Any]]) -> None:
                 # Save search shortcut (works best for text queries)
                 st.write("**Save**")
                 default_name = (q[:40] + ("…" if len(q) > 40 else "")) if q else "saved search"
-                name = st.text_input("Name", value=default_name, key=f"save_name_{it.get('ts')}_{hash(q)}")
-                if st.button("Add to saved", key=f"save_btn_{it.get('ts')}_{hash(q)}"):
+                name = st.text_input("Name", value=default_name, key=f"save_name_{pos}_{it.get('ts')}_{hash(q)}")
+                if st.button("Add to saved", key=f"save_btn_{pos}_{it.get('ts')}_{hash(q)}"):
                     try:
                         add_saved(name=name, params=_extract_params_from_history(it))
                         st.success("Saved.")
@@ -169,7 +180,62 @@ def _pick_two_history(items: List[Dict[str, Any]]) -> Tuple[Dict[str, Any] | Non
     return items[i1], items[i2]
 
 
-def _render_compare(items: List[Dict[str, Any]]) -> None:
+def _run_now(qdrant_client, params_list: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Re-run several past searches against the current index: one embeddings call, one Qdrant batch.
+
+    Searches are re-run from their query text (image searches: the VLM caption that was
+    embedded), "more like this" ones from the stored point id.
+    """
+    texts = [p["query_text"] for p in params_list if not p.get("similar_to")]
+    vectors = iter(embed_texts(texts, dimensions=collection_vector_size(qdrant_client)) if texts else [])
+    queries = [p["similar_to"] if p.get("similar_to") else next(vectors) for p in params_list]
+    results = search_many(
+        qdrant_client,
+        queries,
+        top_k=[int(p.get("top_k") or 10) for p in params_list],
+        qfilters=[build_source_filter(p.get("source_filter")) for p in params_list],
+        texts=[None if p.get("similar_to") else p["query_text"] for p in params_list],
+        with_payload=["filename", "caption"],
+    )
+    return [
+        [
+            {
+                "id": str(r.id),
+                "filename": (r.payload or {}).get("filename"),
+                "caption": (r.payload or {}).get("caption"),
+                "score": float(r.score),
+            }
+            for r in res
+        ]
+        for res in results
+    ]
+
+
+def _missing_points(qdrant_client, params_list: List[Dict[str, Any]]) -> List[str]:
+    """Point ids of "more like this" searches that no longer exist (a batch would fail on them)."""
+    ids = [str(p["similar_to"]) for p in params_list if p.get("similar_to")]
+    if not ids:
+        return []
+    try:
+        alive = existing_ids(qdrant_client, ids)
+    except Exception:
+        return []  # let the search itself report the error
+    return [pid for pid in ids if pid not in alive]
+
+
+def _render_results(results: List[Dict[str, Any]]) -> None:
+    # show top 8 as a simple list (no heavy grid here)
+    for r in results[:8]:
+        fn = (r or {}).get("filename")
+        cap = (r or {}).get("caption") or ""
+        score = (r or {}).get("score")
+        if fn:
+            st.write(f"- **{fn}** (score: {score})")
+        if cap:
+            st.caption(cap[:120] + ("…" if len(cap) > 120 else ""))
+
+
+def _render_compare(items: List[Dict[str, Any]], qdrant_client) -> None:
     st.caption("Compare two past searches side-by-side (Top results + scores).")
 
     a, b = _pick_two_history(items)
@@ -180,6 +246,20 @@ def _render_compare(items: List[Dict[str, Any]]) -> None:
     pa = _extract_params_from_history(a)
     pb = _extract_params_from_history(b)
 
+    pair_key = f"{a.get('ts')}:{b.get('ts')}:{hash(pa['query_text'])}:{hash(pb['query_text'])}"
+    runnable = all(p.get("similar_to") or p.get("query_text") for p in (pa, pb))
+    if st.button("Run both on current index", disabled=not runnable, help="Both searches in one batch request."):
+        missing = _missing_points(qdrant_client, [pa, pb])
+        if missing:
+            st.warning(f"Image {', '.join(missing)} is no longer in the index; these searches can't be re-run.")
+        else:
+            try:
+                st.session_state["compare_now"] = {"key": pair_key, "results": _run_now(qdrant_client, [pa, pb])}
+            except Exception as e:
+                st.error(f"Search failed: {e}")
+    fresh = st.session_state.get("compare_now") or {}
+    fresh_results = fresh.get("results") if fresh.get("key") == pair_key else None
+
     colA, colB = st.columns(2)
     for col, rec, params, label in [(colA, a, pa, "A"), (colB, b, pb, "B")]:
         with col:
@@ -190,20 +270,16 @@ def _render_compare(items: List[Dict[str, Any]]) -> None:
             if st.button(f"Re-run {label}", key=f"rerun_cmp_{label}_{rec.get('ts')}"):
                 _run_search_from_params(params)
 
+            if fresh_results is not None:
+                st.write("**Now:**")
+                _render_results(fresh_results[0 if label == "A" else 1])
+                st.write("**Saved:**")
+
             results = rec.get("results") or []
             if not results:
                 st.info("No results saved for this record.")
                 continue
-
-            # show top 8 as a simple list (no heavy grid here)
-            for r in results[:8]:
-                fn = (r or {}).get("filename")
-                cap = (r or {}).get("caption") or ""
-                score = (r or {}).get("score")
-                if fn:
-                    st.write(f"- **{fn}** (score: {score})")
-                if cap:
-                    st.caption(cap[:120] + ("…" if len(cap) > 120 else ""))
+            _render_results(results)
 
 
 def _render_dashboard(items: List[Dict[str, Any]]) -> None:
@@ -266,7 +342,46 @@ def _render_dashboard(items: List[Dict[str, Any]]) -> None:
     st.dataframe(rows, use_container_width=True, hide_index=True)
 
 
-def render_history() -> None:
+STAGE_ORDER = ["preprocess", "describe", "embed", "search", "upsert", "render", "total"]
+
+
+def _latency_rows(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """p50/p95 per (mode, stage) over history records that carry `timings`."""
+    samples: Dict[Tuple[str, str], List[float]] = {}
+    for it in items:
+        timings = it.get("timings") or {}
+        if not timings:
+            continue
+        mode = it.get("search_mode") or it.get("mode") or "unknown"
+        if it.get("cached"):
+            mode += " (cached)"  # cache hits skip embed/search; keep them from hiding regressions
+        for stage, ms in timings.items():
+            samples.setdefault((mode, stage), []).append(float(ms))
+
+    def order(key: Tuple[str, str]) -> Tuple[str, int, str]:
+        mode, stage = key
+        return mode, STAGE_ORDER.index(stage) if stage in STAGE_ORDER else len(STAGE_ORDER), stage
+
+    rows = []
+    for mode, stage in sorted(samples, key=order):
+        s = summarize(samples[(mode, stage)])
+        rows.append(
+            {"mode": mode, "stage": stage, "n": s["n"], "p50_ms": round(s["p50"], 1), "p95_ms": round(s["p95"], 1)}
+        )
+    return rows
+
+
+def _render_latency(items: List[Dict[str, Any]]) -> None:
+    st.write("### Latency by stage")
+    rows = _latency_rows(items)
+    if not rows:
+        st.info("No timing data yet (recorded for new searches and uploads).")
+        return
+    st.caption("Wall time per stage in ms over the records shown above (Show last N).")
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
+def render_history(qdrant_client) -> None:
     st.subheader("History")
 
     colA, colB, colC, colD = st.columns([1, 1, 1, 2])
@@ -308,6 +423,7 @@ def render_history() -> None:
     with t2:
         _render_saved()
     with t3:
-        _render_compare(items)
+        _render_compare(items, qdrant_client)
     with t4:
         _render_dashboard(items)
+        _render_latency(items)
@@ -1,34 +1,74 @@
 from __future__ import annotations
 
-import re
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, List, Optional, Tuple
 
 import streamlit as st
-from PIL import Image
 
 from src.config import settings
-from src.features.embedding import embed_text
-from src.features.vision import describe_image, pil_to_png_bytes
-from src.services.qdrant_service import search, build_source_filter
+from src.features.dedup import find_near_duplicate
+from src.features.embedding import embed_text, normalize_text
+from src.features.preprocess import prepare_image
+from src.features.search_cache import cached_search
+from src.features.vision import caption_namespace, describe_image
+from src.services.qdrant_service import (
+    build_source_filter,
+    collection_vector_size,
+    existing_ids,
+    get_point,
+    has_sparse_vector,
+    search,
+    search_similar,
+)
 from src.utils.history import append_history
 from src.utils.saved_searches import load_saved
+from src.utils.thumbnails import thumbnail_for
+from src.utils.timing import Timings, collect, span
 
 
-def _tokenize(text: str) -> List[str]:
-    toks = re.findall(r"[a-zA-Z0-9]+", (text or "").lower())
-    return [t for t in toks if len(t) >= 3]
+MORE_LIKE_THIS = "More like this"
 
 
-def _tag_overlap_score(query: str, tags: List[str]) -> float:
-    q = set(_tokenize(query))
-    t = set([x.lower() for x in (tags or [])])
-    if not q or not t:
-        return float("nan")
-    return len(q & t) / max(1, len(t))
+def request_similar(point_id, filename: str = "", label: str = "", source_filter: str = "All", top_k: int = 0) -> None:
+    """Button callback (gallery / result grids): open Search with "more like this" for an indexed point."""
+    st.session_state["prefill_search"] = {
+        "search_mode": MORE_LIKE_THIS,
+        "similar_to": str(point_id),
+        "filename": filename,
+        "query_text": label or Path(filename).name or str(point_id),
+        "source_filter": source_filter,
+        "top_k": top_k or settings.top_k,
+    }
+    st.session_state["menu"] = "Search"
+    st.session_state["run_search_once"] = True
+
+
+def _indexed_match(qdrant_client, prepared) -> Optional[str]:
+    """Id of the indexed point this upload is a copy of (same bytes or same perceptual hash)."""
+    try:
+        if existing_ids(qdrant_client, [prepared.content_id]):
+            return str(prepared.content_id)
+        near = find_near_duplicate(qdrant_client, prepared.phash)
+    except Exception:
+        return None
+    return near[0] if near is not None else None
+
+
+def _indexed_filename(qdrant_client, point_id: str) -> str:
+    try:
+        point = get_point(qdrant_client, point_id)
+    except Exception:
+        return ""
+    return str((point or {}).get("payload", {}).get("filename") or "")
 
 
 def render_search(qdrant_client):
+    # Stage timings (preprocess, describe, embed, search, render) of this run go into the history record.
+    with collect() as timings:
+        _render_search(qdrant_client, timings)
+
+
+def _render_search(qdrant_client, timings: Timings) -> None:
     st.subheader("Search")
 
     # Optional prefill from History → "Re-run"
@@ -62,67 +102,127 @@ def render_search(qdrant_client):
             source_choice = st.selectbox("Filter", source_opts, index=source_opts.index(prefill_source) if prefill_source in source_opts else 0)
 
     mode_opts = ["Text → Image", "Image → Image"]
+    similar_to = prefill.get("similar_to")
+    if similar_to:
+        mode_opts.append(MORE_LIKE_THIS)
     mode = st.radio("Search mode", mode_opts, horizontal=True, index=mode_opts.index(prefill_mode) if prefill_mode in mode_opts else 0)
 
-    query_vector: Optional[List[float]] = None
-    query_label: str = ""
+    # query_key identifies the query before any paid call, so cached results skip them all.
+    query_key: Optional[str] = None
+    compute: Callable[[], Tuple[str, List[Any]]] = lambda: ("", [])
+    # Image → Image on an indexed copy: what to run instead if that point is gone by now.
+    fallback: Optional[Tuple[str, Callable[[], Tuple[str, List[Any]]]]] = None
+    similar: dict = {}  # similar_to/filename of point-based searches, kept in the history record
+    qfilter = build_source_filter(source_choice)
+
+    def by_text(label: str) -> Tuple[str, List[Any]]:
+        vector = embed_text(label, dimensions=collection_vector_size(qdrant_client))
+        # Dense + BM25 over caption/tags, fused by Qdrant (falls back to dense-only without a sparse vector).
+        return label, search(qdrant_client, vector, top_k=top_k, qfilter=qfilter, text=label)
+
+    def by_point(pid: str, label: str, include_self: bool = False) -> Tuple[str, List[Any]]:
+        # Stored vector of an indexed image: no OpenAI call at all.
+        return label, search_similar(qdrant_client, pid, top_k, qfilter=qfilter, include_self=include_self)
 
     if mode == "Text → Image":
         q = st.text_input("Describe what you are looking for", value=prefill_query if mode == "Text → Image" else "", placeholder="e.g. forest in fog, morning light")
         auto_run = bool(st.session_state.pop("run_search_once", False))
         if (auto_run and q) or st.button("Search", type="primary", disabled=not q):
-            query_vector = embed_text(q)
-            query_label = q
+            query_key = f"text:{normalize_text(q)}"
+            compute = lambda: by_text(q)
+    elif mode == MORE_LIKE_THIS:
+        pid = str(similar_to)
+        label = prefill.get("query_text") or pid
+        thumb = thumbnail_for(prefill.get("filename") or "", pid)
+        if thumb is not None:
+            st.image(str(thumb), caption=label, width=240)
+        auto_run = bool(st.session_state.pop("run_search_once", False))
+        if auto_run or st.button("Search", type="primary"):
+            query_key = f"point:{pid}"
+            compute = lambda: by_point(pid, label)
+            similar = {"similar_to": pid, "filename": prefill.get("filename")}
     else:
         up = st.file_uploader("Upload an image", type=["png", "jpg", "jpeg"])
         if up is not None:
-            img = Image.open(up).convert("RGB")
-            st.image(img, caption="Query image", use_container_width=True)
+            prepared = prepare_image(up.getvalue())
+            st.image(prepared.image, caption="Query image", use_container_width=True)
+            match = _indexed_match(qdrant_client, prepared)
+            if match is not None:
+                st.caption(f"Already indexed as {match} — searching with its stored vector (no AI calls).")
             if st.button("Search", type="primary"):
-                img_bytes = pil_to_png_bytes(img)
-                caption = describe_image(img_bytes)
-                query_vector = embed_text(caption)
-                query_label = caption
+                by_caption = (
+                    f"image:{prepared.content_id}:{caption_namespace()}",
+                    lambda: by_text(describe_image(prepared.data, content_id=prepared.content_id, mime=prepared.mime)),
+                )
+                if match is not None:
+                    query_key = f"self:{match}"
+                    compute = lambda: by_point(match, f"image {match}", include_self=True)
+                    fallback = by_caption
+                    similar = {"similar_to": match, "filename": _indexed_filename(qdrant_client, match)}
+                else:
+                    query_key, compute = by_caption
 
-    if query_vector is None:
+    if query_key is None:
         return
 
-    st.caption(f"Query used for embedding: {query_label}")
-
-    qfilter = build_source_filter(source_choice)
-    results = search(qdrant_client, query_vector, top_k=top_k, qfilter=qfilter)
-
-    # Save to local history
     try:
-        append_history({
-            "mode": "search",
-            "search_mode": mode,
-            "source_filter": source_choice,
-            "top_k": top_k,
-            "query_label": query_label[:500],
-            "query_text": query_label[:500],
-            "results": [
-                {
-                    "id": str(getattr(r, "id", "")),
-                    "score": float(getattr(r, "score", 0.0)),
-                    "filename": (getattr(r, "payload", {}) or {}).get("filename"),
-                    "caption": (getattr(r, "payload", {}) or {}).get("caption"),
-                }
-                for r in results
-            ],
-        })
-    except Exception:
-        pass
+        (query_label, results), from_cache = cached_search(query_key, source_choice, top_k, compute)
+    except ValueError as e:  # search_similar: the point was deleted after the link/match was made
+        if fallback is None:
+            st.warning(f"{e} The image was removed from the index; start a new search instead.")
+            return
+        query_key, compute = fallback
+        similar = {}
+        (query_label, results), from_cache = cached_search(query_key, source_choice, top_k, compute)
+
+    what = "Similar to" if query_key.startswith(("point:", "self:")) else "Query used for embedding"
+    st.caption(f"{what}: {query_label}" + (" • ⚡ cached results" if from_cache else ""))
 
+    record = {
+        "mode": "search",
+        "search_mode": mode,
+        "source_filter": source_choice,
+        "top_k": top_k,
+        "query_label": query_label[:500],
+        "query_text": query_label[:500],
+        **similar,
+        "cached": from_cache,
+        "results": [
+            {
+                "id": str(getattr(r, "id", "")),
+                "score": float(getattr(r, "score", 0.0)),
+                "filename": (getattr(r, "payload", {}) or {}).get("filename"),
+                "caption": (getattr(r, "payload", {}) or {}).get("caption"),
+            }
+            for r in results
+        ],
+    }
 
     if not results:
         st.info("No results found.")
+        _save_history(record, timings)
         return
 
+    with span("render"):
+        _render_results(qdrant_client, results, query_key, source_choice, top_k, grid_cols)
+    _save_history(record, timings)
+
+
+def _save_history(record: dict, timings: Timings) -> None:
+    # Saved after rendering so the record carries the full per-stage timings of this search.
+    try:
+        append_history({**record, "timings": timings.to_dict()})
+    except Exception:
+        pass
+
+
+def _render_results(qdrant_client, results: List[Any], query_key: str, source_choice: str, top_k: int, grid_cols: int) -> None:
     scores = [getattr(r, "score", None) for r in results if getattr(r, "score", None) is not None]
+    fused = not query_key.startswith(("point:", "self:")) and settings.hybrid_search and has_sparse_vector(qdrant_client)
+    score_kind = "fused score (RRF, dense + keywords)" if fused else "similarity score (cosine)"
     if scores:
         st.write(
-            f"Results: **{len(results)}** | similarity score (cosine): mean **{sum(scores)/len(scores):.4f}** | max **{max(scores):.4f}**"
+            f"Results: **{len(results)}** | {score_kind}: mean **{sum(scores)/len(scores):.4f}** | max **{max(scores):.4f}**"
         )
 
     # Pagination (client-side)
@@ -143,8 +243,9 @@ def render_search(qdrant_client):
         score = getattr(r, "score", None)
 
         with cols[idx % grid_cols]:
-            if filename and Path(str(filename)).exists():
-                st.image(str(filename), use_container_width=True)
+            thumb = thumbnail_for(filename, getattr(r, "id", None))
+            if thumb is not None:
+                st.image(str(thumb), use_container_width=True)
             else:
                 st.write("(missing file)")
             cap_short = caption[:110] + ("..." if len(caption) > 110 else "")
@@ -154,6 +255,9 @@ def render_search(qdrant_client):
                 st.caption("#" + "  #".join(tags[:6]))
             if score is not None:
                 st.caption(f"score: {score:.4f}")
-            ov = _tag_overlap_score(query_label, tags) if tags else float("nan")
-            if ov == ov:  # not NaN
-                st.caption(f"tag overlap: {ov:.2f}")
\ No newline at end of file
+            st.button(
+                MORE_LIKE_THIS,
+                key=f"mlt_{getattr(r, 'id', '')}_{idx}",
+                on_click=request_similar,
+                args=(getattr(r, "id", ""), filename or "", cap_short, source_choice, top_k),
+            )
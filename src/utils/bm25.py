@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# BM25 document-side weighting. IDF is applied by Qdrant (sparse vector modifier "idf"),
+# which keeps document frequencies up to date as points are upserted/deleted.
+K1 = 1.2
+B = 0.75
+# Average document length. Fixed rather than measured: documents are a VLM caption plus a
+# few tags, so lengths vary little, and a running count could not follow deletes, re-indexes
+# or alias switches (and stored vectors would still carry the value they were built with).
+AVGDL = 20.0
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "this", "to", "with", "tags", "photo", "image", "picture",
+}
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without accents; drops stopwords and 1-letter words (not digits)."""
+    text = unicodedata.normalize("NFKD", text or "").lower()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_RE.findall(text) if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def term_index(token: str) -> int:
+    # Hashed vocabulary: no shared term table to keep in sync; collisions are negligible at 2^31.
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+def document_text(caption: str, tags: Iterable[str] = ()) -> str:
+    return " ".join([caption or "", *[str(t) for t in tags or []]])
+
+
+def _to_sparse(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def document_vector(tokens: List[str], avgdl: Optional[float] = None) -> Tuple[List[int], List[float]]:
+    """(indices, values) of tokenize()d text, with BM25 term-frequency saturation and length normalisation."""
+    if not tokens:
+        return [], []
+    avgdl = avgdl or AVGDL
+    norm = K1 * (1 - B + B * len(tokens) / avgdl)
+    weights: Dict[int, float] = {}
+    for token, tf in Counter(tokens).items():
+        idx = term_index(token)
+        weights[idx] = weights.get(idx, 0.0) + tf * (K1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+
+def query_vector(text: str) -> Tuple[List[int], List[float]]:
+    """Each distinct query term once; Qdrant multiplies by its IDF."""
+    return _to_sparse({term_index(t): 1.0 for t in set(tokenize(text))})
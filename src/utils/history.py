@@ -1,47 +1,96 @@
 from __future__ import annotations
 
 import json
+import sqlite3
+import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 
+HISTORY_DB_PATH = Path("data/history.sqlite")
+# Legacy whole-file store; imported into SQLite once, then renamed to *.migrated.
 HISTORY_PATH = Path("data/history.json")
 
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
 
-def load_history(limit: int | None = None) -> List[Dict[str, Any]]:
-    if not HISTORY_PATH.exists():
-        return []
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    # BEGIN IMMEDIATE takes the write lock, so two processes starting together import only once.
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        items = json.loads(HISTORY_PATH.read_text(encoding="utf-8"))
-        if not isinstance(items, list):
-            return []
+        if HISTORY_PATH.exists():
+            try:
+                items = json.loads(HISTORY_PATH.read_text(encoding="utf-8"))
+            except Exception:
+                items = []
+            if isinstance(items, list):
+                conn.executemany(
+                    "INSERT INTO history (ts, record) VALUES (?, ?)",
+                    [
+                        (int(it.get("ts") or 0), json.dumps(it, ensure_ascii=False))
+                        for it in items
+                        if isinstance(it, dict)
+                    ],
+                )
+            HISTORY_PATH.replace(HISTORY_PATH.with_suffix(".json.migrated"))
+        conn.execute("COMMIT")
     except Exception:
-        return []
-    items = list(reversed(items))  # newest first
-    if limit is not None:
-        items = items[:limit]
-    return items
+        conn.execute("ROLLBACK")
+        raise
 
 
-def append_history(item: Dict[str, Any], max_items: int = 200) -> None:
-    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+def _connect() -> sqlite3.Connection:
+    """Shared WAL-mode connection: appends are single INSERTs, safe across sessions and processes."""
+    global _conn
+    if _conn is None:
+        HISTORY_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(HISTORY_DB_PATH), timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, ts INTEGER NOT NULL, record TEXT NOT NULL)"
+        )
+        if HISTORY_PATH.exists():
+            _migrate_json(conn)
+        _conn = conn
+    return _conn
+
+
+def load_history(limit: int | None = None) -> List[Dict[str, Any]]:
+    """Newest first. Only the last `limit` rows are read."""
+    sql = "SELECT record FROM history ORDER BY id DESC"
+    args: tuple = ()
+    if limit is not None:
+        sql += " LIMIT ?"
+        args = (int(limit),)
+    try:
+        with _lock:
+            rows = _connect().execute(sql, args).fetchall()
+    except sqlite3.Error:
+        return []
     items: List[Dict[str, Any]] = []
-    if HISTORY_PATH.exists():
+    for (record,) in rows:
         try:
-            items = json.loads(HISTORY_PATH.read_text(encoding="utf-8"))
-            if not isinstance(items, list):
-                items = []
+            items.append(json.loads(record))
         except Exception:
-            items = []
+            continue
+    return items
+
+
+def append_history(item: Dict[str, Any], max_items: int = 200) -> None:
     item = dict(item)
     item.setdefault("ts", int(time.time()))
-    items.append(item)
-    if len(items) > max_items:
-        items = items[-max_items:]
-    HISTORY_PATH.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+    record = json.dumps(item, ensure_ascii=False)
+    with _lock:
+        conn = _connect()
+        cur = conn.execute("INSERT INTO history (ts, record) VALUES (?, ?)", (int(item["ts"]), record))
+        # Retention: drop rows older than the newest `max_items` (range delete on the primary key).
+        conn.execute("DELETE FROM history WHERE id <= ?", (cur.lastrowid - max_items,))
 
 
 def clear_history() -> None:
-    if HISTORY_PATH.exists():
-        HISTORY_PATH.unlink()
+    with _lock:
+        _connect().execute("DELETE FROM history")
@@ -3,7 +3,10 @@ from __future__ import annotations
 import hashlib
 
 
-def stable_id_from_bytes(b: bytes) -> int:
+def stable_id_from_digest(digest: bytes) -> int:
     # Qdrant point id can be int. Use first 8 bytes of sha1.
-    h = hashlib.sha1(b).digest()
-    return int.from_bytes(h[:8], "big", signed=False)
+    return int.from_bytes(digest[:8], "big", signed=False)
+
+
+def stable_id_from_bytes(b: bytes) -> int:
+    return stable_id_from_digest(hashlib.sha1(b).digest())
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+CACHE_DIR = Path("data/cache")
+
+
+class SqliteLRUCache:
+    """Small persistent key -> blob cache with LRU eviction.
+
+    Entries live in a SQLite file (WAL mode, safe to share between processes such as
+    the Streamlit app and the scripts). A tiny in-memory LRU sits in front of it so
+    repeated lookups in the same process do not touch the disk at all.
+
+    Keys are namespaced: callers put everything that invalidates a value (model name,
+    dimension, prompt version, ...) into the namespace, so stale entries simply never
+    match again and age out through normal eviction.
+    """
+
+    def __init__(self, path: Path, max_items: int = 50_000, memory_items: int = 1024) -> None:
+        self.path = Path(path)
+        self.max_items = max(1, int(max_items))
+        self.memory_items = max(0, int(memory_items))
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, mk: Tuple[str, str], value: bytes) -> None:
+        if not self.memory_items:
+            return
+        self._mem[mk] = value
+        self._mem.move_to_end(mk)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        mk = (namespace, key)
+        with self._lock:
+            if mk in self._mem:
+                self._mem.move_to_end(mk)
+                self.hits += 1
+                return self._mem[mk]
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value FROM entries WHERE ns = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE entries SET last_used = ? WHERE ns = ? AND key = ?",
+                        (time.time(), namespace, key),
+                    )
+                    conn.commit()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            value = bytes(row[0])
+            self._remember(mk, value)
+            self.hits += 1
+            return value
+
+    def set(self, namespace: str, key: str, value: bytes) -> None:
+        with self._lock:
+            self._remember((namespace, key), value)
+            try:
+                conn = self._connect()
+                cur = conn.execute(
+                    "INSERT OR REPLACE INTO entries (ns, key, value, last_used) VALUES (?, ?, ?, ?)",
+                    (namespace, key, sqlite3.Binary(value), time.time()),
+                )
+                if cur.rowcount:
+                    self._count += 1
+                if self._count > self.max_items:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # Evict down to 90% so we don't pay a DELETE on every insert once full.
+        self._count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = self._count - int(self.max_items * 0.9)
+        if excess <= 0:
+            return
+        conn.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= excess
+        self._mem.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM entries")
+                conn.commit()
+                self._count = 0
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "items": self._count}
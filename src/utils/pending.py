@@ -1,41 +1,182 @@
 from __future__ import annotations
 
 import json
+import random
+import sqlite3
+import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from src.config import settings
 
+
+PENDING_DB_PATH = Path("data/pending.sqlite")
+# Legacy whole-file store; imported into SQLite once, then renamed to *.migrated.
 PENDING_PATH = Path("data/pending_uploads.json")
 
+# A claimed job is invisible to other workers until its lease expires (crash safety).
+LEASE_S = 300.0
 
-def load_pending() -> List[Dict[str, Any]]:
-    if not PENDING_PATH.exists():
-        return []
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if PENDING_PATH.exists():
+            try:
+                items = json.loads(PENDING_PATH.read_text(encoding="utf-8"))
+            except Exception:
+                items = []
+            now = time.time()
+            for it in items if isinstance(items, list) else []:
+                if isinstance(it, dict) and it.get("id") is not None:
+                    _insert(conn, it, now)
+            PENDING_PATH.replace(PENDING_PATH.with_suffix(".json.migrated"))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        PENDING_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(PENDING_DB_PATH), timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, record TEXT NOT NULL, ts INTEGER NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_ts REAL NOT NULL,"
+            " last_error TEXT NOT NULL DEFAULT '', lease_until REAL NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_next_attempt ON jobs(next_attempt_ts)")
+        if PENDING_PATH.exists():
+            _migrate_json(conn)
+        _conn = conn
+    return _conn
+
+
+def _insert(conn: sqlite3.Connection, item: Dict[str, Any], next_attempt_ts: float) -> None:
+    record = {k: v for k, v in item.items() if k not in {"id", "ts", "error"}}
+    conn.execute(
+        "INSERT INTO jobs (id, record, ts, next_attempt_ts, last_error) VALUES (?, ?, ?, ?, ?)"
+        " ON CONFLICT(id) DO UPDATE SET record = excluded.record, last_error = excluded.last_error,"
+        " next_attempt_ts = excluded.next_attempt_ts, lease_until = 0",
+        (
+            str(item["id"]),
+            json.dumps(record, ensure_ascii=False),
+            int(item.get("ts") or time.time()),
+            next_attempt_ts,
+            str(item.get("error") or ""),
+        ),
+    )
+
+
+def _row_to_item(row) -> Dict[str, Any]:
+    pid, record, ts, attempts, next_attempt_ts, last_error = row
     try:
-        items = json.loads(PENDING_PATH.read_text(encoding="utf-8"))
-        if not isinstance(items, list):
-            return []
-        return items
+        item = json.loads(record)
     except Exception:
+        item = {}
+    item.update(
+        {"id": pid, "ts": ts, "attempts": attempts, "next_attempt_ts": next_attempt_ts, "error": last_error}
+    )
+    return item
+
+
+_COLUMNS = "id, record, ts, attempts, next_attempt_ts, last_error"
+
+
+def backoff_s(attempts: int) -> float:
+    """Exponential backoff with ±20% jitter, so a backlog does not retry in lockstep."""
+    delay = min(settings.pending_backoff_max_s, settings.pending_backoff_base_s * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def load_pending() -> List[Dict[str, Any]]:
+    """All queued uploads, oldest first (with attempts / next_attempt_ts / error)."""
+    try:
+        with _lock:
+            rows = _connect().execute(f"SELECT {_COLUMNS} FROM jobs ORDER BY ts, id").fetchall()
+    except sqlite3.Error:
         return []
+    return [_row_to_item(r) for r in rows]
+
+
+def count_pending() -> int:
+    try:
+        with _lock:
+            return _connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    except sqlite3.Error:
+        return 0
 
 
 def add_pending(item: Dict[str, Any]) -> None:
-    PENDING_PATH.parent.mkdir(parents=True, exist_ok=True)
-    items = load_pending()
-    item = dict(item)
-    item.setdefault("ts", int(time.time()))
-    items.append(item)
-    PENDING_PATH.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+    """Queue an upload for background indexing; re-adding an id replaces it."""
+    with _lock:
+        _insert(_connect(), item, time.time() + backoff_s(1))
 
 
 def remove_pending_by_id(point_id: str) -> None:
-    items = [x for x in load_pending() if str(x.get("id")) != str(point_id)]
-    PENDING_PATH.parent.mkdir(parents=True, exist_ok=True)
-    PENDING_PATH.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+    with _lock:
+        _connect().execute("DELETE FROM jobs WHERE id = ?", (str(point_id),))
+
+
+def remove_pending(point_ids: List[str]) -> None:
+    with _lock:
+        _connect().executemany("DELETE FROM jobs WHERE id = ?", [(str(p),) for p in point_ids])
+
+
+def claim_due(limit: int, lease_s: float = LEASE_S) -> List[Dict[str, Any]]:
+    """Lease up to `limit` jobs whose next attempt is due. Safe across threads and processes."""
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE next_attempt_ts <= ? AND lease_until <= ?"
+                " ORDER BY next_attempt_ts LIMIT ?",
+                (now, now, int(limit)),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ?", [(now + lease_s, r[0]) for r in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return [_row_to_item(r) for r in rows]
+
+
+def mark_failed(point_ids: List[str], error: str) -> None:
+    """Release the lease, bump attempts and schedule the next try with backoff."""
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        for pid in point_ids:
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (str(pid),)).fetchone()
+            if row is None:
+                continue
+            attempts = row[0] + 1
+            conn.execute(
+                "UPDATE jobs SET attempts = ?, next_attempt_ts = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                (attempts, now + backoff_s(attempts), str(error)[:500], str(pid)),
+            )
+
+
+def retry_all_now() -> int:
+    """Make every queued job due immediately. Returns the number of jobs."""
+    with _lock:
+        cur = _connect().execute("UPDATE jobs SET next_attempt_ts = ?, lease_until = 0", (time.time(),))
+        return cur.rowcount
 
 
 def clear_pending() -> None:
-    if PENDING_PATH.exists():
-        PENDING_PATH.unlink()
+    with _lock:
+        _connect().execute("DELETE FROM jobs")
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+
+HASH_BITS = 64
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: robust to re-saving, resizing and recompression."""
+    small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    px = list(small.getdata())
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            left = px[row * 9 + col]
+            right = px[row * 9 + col + 1]
+            h = (h << 1) | (1 if left > right else 0)
+    return h
+
+
+def to_hex(h: int) -> str:
+    return f"{h:016x}"
+
+
+def from_hex(s: str) -> Optional[int]:
+    try:
+        return int(s, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance: radius queries visit only a few branches."""
+
+    def __init__(self) -> None:
+        # node = (hash, [ids], {distance: child})
+        self._root: Optional[Tuple[int, List[Any], Dict[int, Any]]] = None
+        self.size = 0
+
+    def add(self, h: int, item_id: Any) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = (h, [item_id], {})
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                if item_id not in node[1]:
+                    node[1].append(item_id)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, [item_id], {})
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, id) within `radius`, closest first."""
+        out: List[Tuple[int, Any]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, i) for i in node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        out.sort(key=lambda x: x[0])
+        return out
+
+
+class PhashIndex:
+    """Thread-safe local mirror of the `phash` payload field of every indexed point."""
+
+    def __init__(self) -> None:
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def add(self, h: int, point_id: Any) -> None:
+        with self._lock:
+            self._tree.add(h, str(point_id))
+
+    def nearest(self, h: int, radius: int) -> Optional[Tuple[str, int]]:
+        """Closest indexed point within `radius` as (point_id, distance), or None."""
+        hits = self.within(h, radius)
+        return hits[0] if hits else None
+
+    def within(self, h: int, radius: int) -> List[Tuple[str, int]]:
+        """All indexed points within `radius` as (point_id, distance), closest first."""
+        with self._lock:
+            hits = self._tree.search(h, radius)
+        return [(pid, d) for d, pid in hits]
+
+    def __len__(self) -> int:
+        return self._tree.size
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image, features
+
+from src.config import settings
+from src.utils.kv_cache import CACHE_DIR
+
+
+THUMB_DIR = CACHE_DIR / "thumbs"
+
+_lock = threading.Lock()
+_total_bytes: Optional[int] = None  # lazily computed size of THUMB_DIR
+
+
+def _format() -> Tuple[str, str]:
+    fmt = (settings.thumb_format or "WEBP").upper()
+    if fmt == "WEBP" and not features.check("webp"):
+        fmt = "JPEG"
+    return fmt, ".webp" if fmt == "WEBP" else ".jpg"
+
+
+def thumb_path(content_id: int | str, size: Optional[int] = None) -> Path:
+    """Content-addressed location: the point id is already a hash of the image content."""
+    size = size or settings.thumb_size
+    key = str(content_id)
+    return THUMB_DIR / key[-2:] / f"{key}_{size}{_format()[1]}"
+
+
+def make_thumbnail(img: Image.Image, content_id: int | str, size: Optional[int] = None) -> Path:
+    """Write (or reuse) the thumbnail for an already decoded image."""
+    out = thumb_path(content_id, size)
+    if out.exists():
+        return out
+    size = size or settings.thumb_size
+    fmt, _ = _format()
+    thumb = img.convert("RGB")
+    thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temp file per writer: the same image may be thumbnailed concurrently
+    # (upload job + gallery lazy path, or two processes); os.replace keeps it atomic.
+    fd, tmp = tempfile.mkstemp(prefix=out.name + ".", suffix=".tmp", dir=out.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            thumb.save(f, format=fmt, quality=settings.thumb_quality)
+        os.replace(tmp, out)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _account(out.stat().st_size)
+    return out
+
+
+def thumbnail_for(src: str | Path | None, content_id: int | str | None, size: Optional[int] = None) -> Optional[Path]:
+    """Path of a small preview for `src`, generating it lazily for legacy files.
+
+    Returns None when the original is missing. Falls back to the original path if the
+    thumbnail can't be produced (e.g. unreadable file) so the grid still renders.
+    """
+    if not src:
+        return None
+    src = Path(str(src))
+    if content_id is None:
+        return src if src.exists() else None
+    out = thumb_path(content_id, size)
+    if out.exists():
+        _touch(out)
+        return out
+    if not src.exists():
+        return None
+    try:
+        with Image.open(src) as img:
+            img.draft("RGB", (size or settings.thumb_size,) * 2)  # JPEG: decode at reduced scale
+            return make_thumbnail(img, content_id, size)
+    except Exception:
+        return src
+
+
+def _touch(path: Path) -> None:
+    # Approximate LRU without a write per view: refresh mtime at most once an hour.
+    try:
+        if time.time() - path.stat().st_mtime > 3600:
+            os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _account(added: int) -> None:
+    global _total_bytes
+    with _lock:
+        if _total_bytes is None:
+            _total_bytes = sum(p.stat().st_size for p in THUMB_DIR.rglob("*") if p.is_file())
+        else:
+            _total_bytes += added
+        if _total_bytes > settings.thumb_cache_max_mb * 1024 * 1024:
+            _total_bytes = _evict(int(settings.thumb_cache_max_mb * 1024 * 1024 * 0.9))
+
+
+def _evict(target: int) -> int:
+    files = []
+    for p in THUMB_DIR.rglob("*"):
+        try:
+            if p.is_file():
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+        except OSError:
+            continue
+    total = sum(sz for _, sz, _ in files)
+    for _, sz, p in sorted(files):
+        if total <= target:
+            break
+        try:
+            p.unlink()
+            total -= sz
+        except OSError:
+            pass
+    return total
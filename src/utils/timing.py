@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Set, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Timings:
+    """Wall time per stage (ms) for one request: a search, an upload, ...
+
+    Repeated spans of a stage add up; a span nested in a span of the same stage is not
+    counted twice (e.g. search_similar -> search). "total" is the time since the collector
+    started (plus any seeded total).
+    """
+
+    def __init__(self, spans: Optional[Dict[str, float]] = None) -> None:
+        self.spans: Dict[str, float] = dict(spans or {})
+        self._open: Set[str] = set()
+        self._t0 = time.perf_counter()
+
+    def add(self, stage: str, ms: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + ms
+
+    def to_dict(self) -> Dict[str, float]:
+        total = self.spans.get("total", 0.0) + (time.perf_counter() - self._t0) * 1000
+        return {**{k: round(v, 2) for k, v in self.spans.items()}, "total": round(total, 2)}
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+@contextmanager
+def collect(spans: Optional[Dict[str, float]] = None) -> Iterator[Timings]:
+    """Collect spans from everything called inside the block (same thread).
+
+    `spans` seeds the collector, e.g. with stages measured earlier in another thread.
+    """
+    timings = Timings(spans)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as `stage`. Free when no collector is active (workers, scripts)."""
+    timings = _current.get()
+    if timings is None or stage in timings._open:
+        yield
+        return
+    timings._open.add(stage)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._open.discard(stage)
+        timings.add(stage, (time.perf_counter() - t0) * 1000)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Decorator form of `span`."""
+
+    def deco(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Optional
+
+from src.utils.kv_cache import CACHE_DIR
+
+VERSIONS_PATH = CACHE_DIR / "versions.sqlite"
+# One counter for all Qdrant writes: coarse, but trivially correct across collections and aliases.
+QDRANT = "qdrant"
+# Bumped only when points disappear (deletes, alias switches), so local mirrors of the
+# collection (the phash index) can rebuild without reloading after every insert.
+QDRANT_DELETES = "qdrant_deletes"
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Shared by the app and the scripts, so a seed/migration run invalidates the app's caches too."""
+    global _conn
+    if _conn is None:
+        VERSIONS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(VERSIONS_PATH), timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        _conn = conn
+    return _conn
+
+
+def get_version(name: str = QDRANT) -> int:
+    """Current data version; -1 if it cannot be read (callers must then bypass their caches)."""
+    try:
+        with _lock:
+            row = _connect().execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+    except sqlite3.Error:
+        return -1
+    return int(row[0]) if row else 0
+
+
+def bump_version(name: str = QDRANT) -> None:
+    try:
+        with _lock:
+            _connect().execute(
+                "INSERT INTO versions (name, version) VALUES (?, 1)"
+                " ON CONFLICT(name) DO UPDATE SET version = version + 1",
+                (name,),
+            )
+    except sqlite3.Error:
+        pass  # best-effort; cached results then live at most search_cache_ttl_s
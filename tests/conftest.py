@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+# Offline, deterministic providers (src/services/providers.py); set before src.config is imported.
+os.environ.setdefault("EMBEDDING_PROVIDER", "local")
+os.environ.setdefault("CAPTION_PROVIDER", "local")
+os.environ.setdefault("EMBEDDING_DIM", "64")
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
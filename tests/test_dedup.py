@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from src.config import settings
+
+
+def test_deleted_point_is_not_a_near_duplicate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.features import dedup
+    from src.services.qdrant_service import delete_points
+
+    monkeypatch.setattr(dedup, "_index", None)
+    client = QdrantClient(":memory:")
+    client.create_collection(settings.qdrant_collection, vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    client.upsert(settings.qdrant_collection, [PointStruct(id=7, vector=[1, 0, 0, 0], payload={"phash": f"{0xF0F0:016x}"})])
+
+    assert dedup.find_near_duplicate(client, 0xF0F1, radius=2) == ("7", 1)
+    delete_points(client, [7])
+    assert dedup.find_near_duplicate(client, 0xF0F1, radius=2) is None
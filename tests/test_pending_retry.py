@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from PIL import Image, ImageDraw
+from qdrant_client import QdrantClient
+
+from src.config import settings
+
+
+def test_captionless_retry_captions_before_indexing(tmp_path, monkeypatch):
+    # Pending queue and history live under the working directory.
+    monkeypatch.chdir(tmp_path)
+    from src.services.qdrant_service import ensure_collection_exists
+    from src.ui.tab_add import _retry_pending
+    from src.utils import history, pending
+
+    monkeypatch.setattr(pending, "_conn", None)
+    monkeypatch.setattr(history, "_conn", None)
+    client = QdrantClient(":memory:")
+    ensure_collection_exists(client)
+
+    path = tmp_path / "data" / "images" / "user" / "42.png"
+    path.parent.mkdir(parents=True)
+    img = Image.new("RGB", (320, 240), (30, 90, 200))
+    ImageDraw.Draw(img).rectangle([40, 40, 200, 180], fill=(240, 200, 30))
+    img.save(path)
+
+    # What bulk upload / the upload job queue when the VLM is down.
+    item = {"id": "42", "filename": str(path), "caption": "", "tags": ["mine"], "phash": "", "source": "user_upload"}
+    pending.add_pending(item)
+    _retry_pending(client, item)
+
+    (point,) = client.retrieve(settings.qdrant_collection, ids=[42], with_payload=True)
+    assert point.payload["caption"].strip()
+    assert "mine" in point.payload["tags"]
+    assert point.payload["phash"]
+    assert pending.load_pending() == []
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+from qdrant_client import QdrantClient
+
+from src.config import settings
+
+
+@pytest.fixture
+def seed(tmp_path, monkeypatch):
+    # Caches, version counters and the manifest all live under the working directory.
+    monkeypatch.chdir(tmp_path)
+    import seed_stock
+    from src.features import dedup
+
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(seed_stock, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(seed_stock, "DATA_DIR", tmp_path / "images")
+    monkeypatch.setattr(seed_stock, "MANIFEST_PATH", tmp_path / "seed_manifest.json")
+    monkeypatch.setattr(seed_stock, "CHECKPOINT_PATH", tmp_path / "seed_checkpoint.jsonl")
+    monkeypatch.setattr(dedup, "_index", None)
+    return seed_stock, client
+
+
+def _photo() -> Image.Image:
+    img = Image.new("RGB", (640, 480))
+    draw = ImageDraw.Draw(img)
+    for x in range(0, 640, 8):
+        draw.rectangle([x, 0, x + 8, 480], fill=(x % 256, (x * 3) % 256, 255 - x % 256))
+    draw.ellipse([180, 120, 460, 360], fill=(250, 240, 20))
+    return img
+
+
+def _ids(client: QdrantClient) -> set:
+    points, _ = client.scroll(settings.qdrant_collection, limit=100)
+    return {p.id for p in points}
+
+
+def test_reencoded_file_keeps_its_point(seed):
+    seed_stock, client = seed
+    path = seed_stock.DATA_DIR / "sunflower.jpg"
+    path.parent.mkdir()
+    _photo().save(path, quality=95)
+    seed_stock.main()
+    (original,) = _ids(client)
+
+    # Same photo, different bytes: a new content id, but a near-duplicate by phash.
+    _photo().save(path, quality=70)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    seed_stock.main()
+
+    assert _ids(client) == {original}
+    assert seed_stock._load_manifest()[str(path)]["id"] == original